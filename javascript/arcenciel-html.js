@@ -79,6 +79,21 @@ function arcencielSendToTxt2Img({prompt, negPrompt, sampler, seed, steps, cfg})
 // ----------------------------------------------------------------------
 
 document.addEventListener("click", function (e) {
+    // 0) Pause / resume / cancel of one download (version blocks and the download panel)
+    const controlBtn = e.target.closest(".arcen_download_control_btn");
+    if (controlBtn) {
+        e.stopPropagation();
+        const controls = controlBtn.closest("[data-model-id][data-version-id]");
+        if (controls) {
+            arcencielDownloadControl(
+                controls.getAttribute("data-model-id"),
+                controls.getAttribute("data-version-id"),
+                controlBtn.getAttribute("data-action")
+            );
+        }
+        return;
+    }
+
     // 1) "Download with Extension" button
     const extBtn = e.target.closest(".arcen_extension_download_btn");
     if (extBtn) {
@@ -87,6 +102,9 @@ document.addEventListener("click", function (e) {
         const modelType = extBtn.getAttribute("data-model-type");
         const downloadUrl = extBtn.getAttribute("data-download-url");
         const fileName = extBtn.getAttribute("data-file-name");
+        // Expected hashes, so the server can verify the finished file
+        const sha256 = extBtn.getAttribute("data-sha256") || "";
+        const sha256webui = extBtn.getAttribute("data-sha256-webui") || "";
 
         // Find the subfolder input inside the same 'version_block' container
         let versionBlock = extBtn.closest(".version_block");
@@ -103,29 +121,16 @@ document.addEventListener("click", function (e) {
         });
 
         // Now pass 'subfolder: subfolderVal' to the server route
-        fetch("/arcenciel/download_with_extension", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-                model_id: modelId,
-                version_id: versionId,
-                model_type: modelType,
-                url: downloadUrl,
-                file_name: fileName,
-                subfolder: subfolderVal
-            })
-        })
-        .then(resp => {
-            if (!resp.ok) {
-                console.error("Extension download route error:", resp.status, resp.statusText);
-                return {message: `Error: ${resp.statusText}`};
-            }
-            return resp.json().catch(() => ({}));
-        })
-        .then(data => {
-            // console.log("ArcEnCiel: extension download response:", data);
-        })
-        .catch(err => console.error("ArcEnCiel: extension download fetch error:", err));
+        arcencielRequestDownload({
+            model_id: modelId,
+            version_id: versionId,
+            model_type: modelType,
+            url: downloadUrl,
+            file_name: fileName,
+            subfolder: subfolderVal,
+            sha256: sha256,
+            sha256webui: sha256webui
+        });
 
         return;
     }
@@ -186,6 +191,45 @@ document.addEventListener("click", function (e) {
     }
 });
 
+/**
+ * Posts a download request. If the server already has the file (matched by
+ * sha256), asks whether to link it into the chosen folder or download again.
+ */
+function arcencielRequestDownload(payload) {
+    fetch("/arcenciel/download_with_extension", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(payload)
+    })
+    .then(resp => {
+        if (!resp.ok) {
+            console.error("Extension download route error:", resp.status, resp.statusText);
+            return {message: `Error: ${resp.statusText}`};
+        }
+        return resp.json().catch(() => ({}));
+    })
+    .then(data => {
+        // console.log("ArcEnCiel: extension download response:", data);
+        if (data.status === "duplicate") {
+            const link = confirm(
+                `${payload.file_name} is already on disk:\n${data.existing_path}\n\n` +
+                `OK: link it to ${data.target_path} (hardlink, or a copy across drives)\n` +
+                `Cancel: don't link`
+            );
+            if (link) {
+                arcencielRequestDownload({...payload, on_duplicate: "link"});
+            } else if (confirm(`Download ${payload.file_name} again anyway?`)) {
+                arcencielRequestDownload({...payload, on_duplicate: "download"});
+            }
+        } else if (data.status === "exists") {
+            alert(data.message);
+        } else if (data.error) {
+            console.error("ArcEnCiel: extension download error:", data.error);
+        }
+    })
+    .catch(err => console.error("ArcEnCiel: extension download fetch error:", err));
+}
+
 // Listen for gear-button clicks, toggle the popup
 document.addEventListener("click", function (e) {
     const settingsBtn = e.target.closest("#arcenciel_settings_button");
@@ -256,3 +300,175 @@ function setupArcencielSliderObserver() {
 setTimeout(() => {
   setupArcencielSliderObserver();
 }, 1000);
+
+// ----------------------------------------------------------------------
+// Live preview patches for search results
+// ----------------------------------------------------------------------
+
+/**
+ * Long-polls a search's update channel and swaps card images in place,
+ * so the gallery HTML itself is only sent once per search.
+ */
+function arcencielFollowSearchUpdates(list) {
+    const searchId = list.getAttribute("data-search-id");
+    if (!searchId || list.dataset.arcenFollowing) return;
+    list.dataset.arcenFollowing = "1";
+
+    let cursor = 0;
+    const poll = () => {
+        // A newer search replaced this gallery => stop
+        if (!list.isConnected) return;
+        fetch(`/arcenciel/search_updates/${searchId}?since=${cursor}`)
+            .then(resp => resp.json())
+            .then(data => {
+                for (const upd of (data.updates || [])) {
+                    const img = list.querySelector(`.arcen_model_card[data-model-id="${upd.id}"] img.model-bg`);
+                    if (img) img.src = upd.src;
+                }
+                cursor = data.cursor ?? cursor;
+                if (!data.done) poll();
+            })
+            .catch(err => console.error("ArcEnCiel: search update poll failed:", err));
+    };
+    poll();
+}
+
+function setupArcencielResultsObserver() {
+    const root = getGradioAppRoot();
+    const results = root && root.querySelector("#arcenciel_results_html");
+    if (!results) {
+        setTimeout(setupArcencielResultsObserver, 1000);
+        return;
+    }
+    const observer = new MutationObserver(() => {
+        results.querySelectorAll(".arcen_model_list[data-search-id]").forEach(arcencielFollowSearchUpdates);
+    });
+    observer.observe(results, {childList: true, subtree: true});
+}
+
+setTimeout(() => {
+  setupArcencielResultsObserver();
+}, 1000);
+
+// ----------------------------------------------------------------------
+// Download panel, fed by /arcenciel/downloads/stream (server-sent events)
+// ----------------------------------------------------------------------
+
+function arcencielEscapeHtml(text) {
+    return String(text ?? "").replace(/[&<>"']/g, c => ({
+        "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"
+    })[c]);
+}
+
+function arcencielFormatBytes(bytes) {
+    if (!bytes) return "0 B";
+    const units = ["B", "KB", "MB", "GB", "TB"];
+    const i = Math.min(units.length - 1, Math.floor(Math.log(bytes) / Math.log(1024)));
+    return `${(bytes / Math.pow(1024, i)).toFixed(i ? 1 : 0)} ${units[i]}`;
+}
+
+function arcencielFormatEta(seconds) {
+    if (seconds === null || seconds === undefined) return "";
+    seconds = Math.round(seconds);
+    const h = Math.floor(seconds / 3600);
+    const m = Math.floor((seconds % 3600) / 60);
+    const s = seconds % 60;
+    return h ? `${h}h ${m}m` : (m ? `${m}m ${s}s` : `${s}s`);
+}
+
+function arcencielDownloadControl(modelId, versionId, action) {
+    fetch(`/arcenciel/downloads/${encodeURIComponent(modelId)}/${encodeURIComponent(versionId)}/${action}`, {method: "POST"})
+        .then(resp => resp.json())
+        .then(data => {
+            if (!data.ok) console.warn(`ArcEnCiel: could not ${action} download ${data.key} (${data.status})`);
+        })
+        .catch(err => console.error(`ArcEnCiel: download ${action} failed:`, err));
+}
+
+function arcencielControlButtons(state) {
+    const button = (action, label, title) =>
+        `<button class="arcen_download_control_btn" data-action="${action}" title="${title}">${label}</button>`;
+    if (state === "queued" || state === "active") {
+        return button("pause", "&#10074;&#10074;", "Pause") + button("cancel", "&#10006;", "Cancel");
+    }
+    if (state === "paused") {
+        return button("resume", "&#9654;", "Resume") + button("cancel", "&#10006;", "Cancel");
+    }
+    return "";
+}
+
+// One small bar per byte range of a segmented download
+function arcencielSegmentBars(segments) {
+    if (!segments || segments.length < 2) return "";
+    const bars = segments.map(([done, size], i) => {
+        const pct = size ? Math.min(100, 100 * done / size) : 0;
+        const tip = `Segment ${i + 1}: ${arcencielFormatBytes(done)} / ${arcencielFormatBytes(size)}`;
+        return `<div title="${tip}"><div style="width:${pct.toFixed(1)}%"></div></div>`;
+    });
+    return `<div class="arcen_download_segments">${bars.join("")}</div>`;
+}
+
+function renderArcencielDownloads(panel, data) {
+    const items = data.items || [];
+    if (!items.length) {
+        panel.innerHTML = "";
+        return;
+    }
+
+    let html = `<div class="arcen_download_summary"><b>Downloads</b>: ${data.active} active, ${data.queued} queued, ${data.paused} paused</div>`;
+    html += "<table class='arcen_download_table'>";
+    for (const item of items.slice().reverse()) {
+        const pct = item.total ? Math.min(100, 100 * item.bytes_done / item.total) : 0;
+        let size = item.total
+            ? `${arcencielFormatBytes(item.bytes_done)} / ${arcencielFormatBytes(item.total)}`
+            : arcencielFormatBytes(item.bytes_done);
+        const unfinished = item.state === "active" || item.state === "paused";
+        const segments = unfinished && item.segments ? item.segments : null;
+        if (segments) {
+            const left = segments.filter(([done, segSize]) => done < segSize).length;
+            size += ` (${segments.length} segments, ${left} left)`;
+        }
+        let speed = "";
+        if (item.state === "active") {
+            speed = `${arcencielFormatBytes(item.rate)}/s (avg ${arcencielFormatBytes(item.average_rate)}/s)`;
+        } else if (item.average_rate) {
+            speed = `avg ${arcencielFormatBytes(item.average_rate)}/s`;
+        }
+        const title = item.error ? ` title="${arcencielEscapeHtml(item.error)}"` : "";
+
+        html += `<tr class="arcen_download_row arcen_download_${item.state}"
+                     data-model-id="${arcencielEscapeHtml(item.model_id)}" data-version-id="${arcencielEscapeHtml(item.version_id)}">
+            <td>${arcencielEscapeHtml(item.file_name)}</td>
+            <td${title}>${item.state}</td>
+            <td><div class="arcen_download_bar"><div style="width:${pct.toFixed(1)}%"></div></div>${arcencielSegmentBars(segments)}</td>
+            <td>${size}</td>
+            <td>${speed}</td>
+            <td>${item.state === "active" ? arcencielFormatEta(item.eta) : ""}</td>
+            <td>${arcencielControlButtons(item.state)}</td>
+        </tr>`;
+    }
+    html += "</table>";
+    panel.innerHTML = html;
+}
+
+function setupArcencielDownloadPanel() {
+    const root = getGradioAppRoot();
+    const panel = root && root.querySelector("#arcen_download_panel");
+    if (!panel) {
+        setTimeout(setupArcencielDownloadPanel, 1000);
+        return;
+    }
+    // EventSource reconnects on its own if the server restarts
+    const source = new EventSource("/arcenciel/downloads/stream");
+    source.onmessage = (event) => {
+        try {
+            renderArcencielDownloads(panel, JSON.parse(event.data));
+        } catch (err) {
+            console.error("ArcEnCiel: bad download status update:", err);
+        }
+    };
+}
+
+setTimeout(() => {
+  setupArcencielDownloadPanel();
+}, 1000);
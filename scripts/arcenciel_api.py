@@ -1,29 +1,187 @@
 # scripts/arcenciel_api.py
 import requests
 import os
+import copy
+import time
+import asyncio
+import threading
+import email.utils
 import scripts.arcenciel_global as gl
+import scripts.arcenciel_http as http
+import scripts.arcenciel_cache as cache
+import scripts.arcenciel_thumbs as thumbs
 from scripts.arcenciel_global import debug_print
-import base64
 
-ARC_API_BASE = "https://arcenciel.io/api"
+# Overridable so the extension (e.g. the catalog sync) can be pointed at a local stub server
+ARC_API_BASE = os.environ.get("ARCENCIEL_API_BASE", "https://arcenciel.io/api").rstrip("/")
 # Base URL for image files (remove the "/api" part)
-THUMBNAIL_BASE_URL = "https://arcenciel.io/uploads"
+THUMBNAIL_BASE_URL = thumbs.THUMBNAIL_BASE_URL
 
-def request_arc_api(endpoint="", params=None):
-    """Generic GET to ArcEnCiel, returns dict or error info."""
+# When the API answers 429, every thread waits until this monotonic timestamp
+_rate_limit_lock = threading.Lock()
+_retry_not_before = 0.0
+
+# Single-flight: identical calls (same endpoint + params) made while one is
+# already in flight wait for it and share its result instead of going upstream.
+# Shared by this module and arcenciel_api_async, so sync and async callers
+# coalesce with each other too.
+_flights_lock = threading.Lock()
+_flights = {}  # cache key -> Flight
+_flight_stats = {"upstream": 0, "coalesced": 0}
+
+class Flight:
+    """One upstream call that later identical calls can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.followers = 0
+        self._waiters = []  # (event loop, asyncio.Future) of async followers
+
+    def wait(self):
+        self.done.wait()
+        return copy.deepcopy(self.result)  # callers may mutate what they get back
+
+    async def wait_async(self):
+        loop = asyncio.get_running_loop()
+        with _flights_lock:
+            if not self.done.is_set():
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            else:
+                future = None
+        if future is not None:
+            await future
+        return copy.deepcopy(self.result)
+
+def join_flight(key):
+    """
+    Returns (flight, leader). The leader makes the call and must hand its result
+    to land_flight(); everyone else gets it from flight.wait() / wait_async().
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            flight.followers += 1
+            _flight_stats["coalesced"] += 1
+            return flight, False
+        flight = _flights[key] = Flight()
+        _flight_stats["upstream"] += 1
+        return flight, True
+
+def land_flight(key, flight, result):
+    """Publish the leader's result. Returns what the leader itself should return."""
+    with _flights_lock:
+        _flights.pop(key, None)
+        flight.result = result
+        flight.done.set()
+        waiters, flight._waiters = flight._waiters, []
+    for loop, future in waiters:
+        loop.call_soon_threadsafe(_resolve_waiter, future)
+    # Followers copy from flight.result, so the leader mustn't hand out that same object
+    return copy.deepcopy(result) if flight.followers else result
+
+def _resolve_waiter(future):
+    if not future.done():
+        future.set_result(None)
+
+def get_stats():
+    with _flights_lock:
+        stats = dict(_flight_stats)
+        stats["in_flight"] = len(_flights)
+    return stats
+
+def _parse_retry_after(value):
+    """Retry-After is either delta-seconds or an HTTP date. Returns seconds to wait."""
+    if not value:
+        return gl.api_rate_limit_default_wait
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return gl.api_rate_limit_default_wait
+
+def rate_limit_delay():
+    """Seconds left before the API may be called again after a 429 (0 if none)."""
+    with _rate_limit_lock:
+        return max(0.0, _retry_not_before - time.monotonic())
+
+def _wait_for_rate_limit():
+    delay = rate_limit_delay()
+    if delay > 0:
+        time.sleep(delay)
+
+def note_rate_limited(retry_after):
+    """Make every caller, sync or async, hold off for the server's Retry-After."""
+    global _retry_not_before
+    delay = min(_parse_retry_after(retry_after), gl.api_rate_limit_max_wait)
+    with _rate_limit_lock:
+        _retry_not_before = max(_retry_not_before, time.monotonic() + delay)
+    debug_print(f"ArcEnCiel API rate limited, backing off {delay:.1f}s")
+
+def request_arc_api(endpoint="", params=None, cache_kind=None, kind="api"):
+    """
+    Generic GET to ArcEnCiel, returns dict or error info.
+    On 429 the Retry-After delay is honored by all threads before retrying.
+    If 'cache_kind' is given (a key of gl.response_cache_ttls), fresh cached
+    responses are returned without a request, and stale ones are revalidated
+    with If-None-Match / If-Modified-Since.
+    A call identical to one already in flight waits for that one instead.
+    'kind' is the arcenciel_http traffic kind; background callers pass
+    "prefetch" so they stay out of the interactive lane.
+    """
     if not params:
         params = {}
+    key = cache.make_key(endpoint, params)
+    flight, leader = join_flight(key)
+    if not leader:
+        return flight.wait()
+    result = {"error": "Request failed"}
+    try:
+        result = _request_arc_api(endpoint, params, cache_kind, kind)
+    finally:
+        result = land_flight(key, flight, result)
+    return result
+
+def _request_arc_api(endpoint, params, cache_kind, kind):
     url = f"{ARC_API_BASE}{endpoint}"
     #gl.debug_print("request_arc_api ->", url, params)
-    try:
-        r = requests.get(url, params=params, timeout=20)
-        r.raise_for_status()
-        return r.json()
-    except requests.RequestException as e:
-        #gl.debug_print("ArcEnCiel API error:", e)
-        return {"error": str(e)}
-
-def search_models(search_term="", sort="newest", page=1, limit=12, base_model="", model_type=""):
+
+    ttl = cache.ttl_for(cache_kind) if cache_kind else 0
+    cache_key = cached_entry = None
+    if ttl > 0:
+        cache_key = cache.make_key(endpoint, params)
+        data, cached_entry = cache.lookup(cache_key)
+        if data is not None:
+            return data
+
+    attempts = 1 + max(0, gl.api_rate_limit_retries)
+    for attempt in range(attempts):
+        _wait_for_rate_limit()
+        try:
+            r = http.get(url, kind=kind, params=params,
+                         headers=cache.revalidation_headers(cached_entry))
+            if r.status_code == 429 and attempt + 1 < attempts:
+                note_rate_limited(r.headers.get("Retry-After"))
+                continue
+            if r.status_code == 304 and cached_entry is not None:
+                return cache.refresh(cache_key, cached_entry, ttl)
+            r.raise_for_status()
+            data = r.json()
+            if cache_key is not None and isinstance(data, dict) and "error" not in data:
+                cache.store(cache_key, r.text, ttl,
+                            etag=r.headers.get("ETag"),
+                            last_modified=r.headers.get("Last-Modified"))
+            return data
+        except requests.RequestException as e:
+            #gl.debug_print("ArcEnCiel API error:", e)
+            return {"error": str(e)}
+
+def search_models(search_term="", sort="newest", page=1, limit=12, base_model="", model_type="", kind="api"):
     params = {
         "search": search_term,
         "sort": sort,
@@ -35,16 +193,16 @@ def search_models(search_term="", sort="newest", page=1, limit=12, base_model=""
     if model_type:
         params["modelType"] = model_type
 
-    result = request_arc_api("/models/search", params)
+    result = request_arc_api("/models/search", params, cache_kind="search", kind=kind)
     return result
 
 def get_model_versions(model_id):
     endpoint = f"/models/{model_id}/versions"
-    return request_arc_api(endpoint)
+    return request_arc_api(endpoint, cache_kind="versions")
 
 def fetch_model_details(model_id):
     endpoint = f"/models/{model_id}"
-    return request_arc_api(endpoint)
+    return request_arc_api(endpoint, cache_kind="model")
 
 def get_model_gallery(model_id):
     """
@@ -52,9 +210,10 @@ def get_model_gallery(model_id):
     Expected response: {"data": [ { "id":..., "filePath": ... , ... } ], ...}
     """
     endpoint = f"/models/{model_id}/gallery"
-    return request_arc_api(endpoint)
+    return request_arc_api(endpoint, cache_kind="gallery")
 
-def download_preview_image(model_item):
+def preview_file_path(model_item):
+    """Remote filePath of the first image of the first version, or None."""
     versions = model_item.get("versions", [])
     if versions and isinstance(versions, list):
         first_version = versions[0]
@@ -63,19 +222,24 @@ def download_preview_image(model_item):
             first_img = images[0]
             file_path = first_img.get("filePath", "")
             if file_path:
-                file_base, _ = os.path.splitext(file_path.lstrip("/"))
-                thumbnail_url = f"{THUMBNAIL_BASE_URL}/{file_base}.thumbnail.webp"
-                #debug_print("Downloading preview from:", thumbnail_url)
-                try:
-                    r = requests.get(thumbnail_url, timeout=20)
-                    r.raise_for_status()
-                    content = r.content
-                    encoded = base64.b64encode(content).decode("utf-8")
-                    data_url = f"data:image/webp;base64,{encoded}"
-                    #debug_print("Returning data URL (length:", len(data_url), ")")
-                    return data_url
-                except Exception as e:
-                    debug_print("Error downloading preview:", e)
+                return file_path
+    return None
+
+def download_preview_image(model_item):
+    """
+    Make sure the preview thumbnail is in the local thumbnail store and return
+    its short /arcenciel/thumb/... URL, or None if there's no preview.
+    """
+    file_path = preview_file_path(model_item)
+    if file_path and thumbs.get_thumbnail(file_path):
+        return thumbs.local_url(file_path)
+    return None
+
+def download_preview_file(model_item):
+    """Like download_preview_image, but returns the local file path of the thumbnail."""
+    file_path = preview_file_path(model_item)
+    if file_path:
+        return thumbs.get_thumbnail(file_path)
     return None
 
 def fetch_image_details(image_id):
@@ -84,5 +248,5 @@ def fetch_image_details(image_id):
     Returns dict with image info or {"error": "..."}.
     """
     endpoint = f"/images/{image_id}/info"
-    result = request_arc_api(endpoint)
+    result = request_arc_api(endpoint, cache_kind="image")
     return result
\ No newline at end of file
@@ -0,0 +1,123 @@
+# scripts/arcenciel_api_async.py
+import asyncio
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_api as api
+import scripts.arcenciel_http as http
+import scripts.arcenciel_cache as cache
+
+try:
+    import httpx
+except ImportError:  # installed by install.py; gradio pulls it in as well
+    httpx = None
+
+# asyncio flavour of arcenciel_api for the FastAPI routes, so they don't tie
+# up Starlette's threadpool (which WebUI's own API needs) while waiting on
+# arcenciel.io, and can run independent calls concurrently.
+# Shares the response cache and the 429 back-off with the sync client.
+
+_clients = {}  # event loop -> httpx.AsyncClient (a client must stay on the loop it was made on)
+
+
+def _get_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        connect, read = http.TIMEOUTS["api"]
+        client = httpx.AsyncClient(
+            headers={"User-Agent": http.USER_AGENT},
+            timeout=httpx.Timeout(read, connect=connect),
+            # limits go on the transport: the client ignores its own once given one
+            transport=httpx.AsyncHTTPTransport(
+                retries=gl.http_retries,  # connect errors only
+                limits=httpx.Limits(max_connections=gl.http_pool_maxsize,
+                                    max_keepalive_connections=gl.http_pool_maxsize),
+            ),
+            follow_redirects=True,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def request_arc_api(endpoint="", params=None, cache_kind=None):
+    """
+    Async twin of arcenciel_api.request_arc_api: same caching, same errors,
+    and it joins the same in-flight calls (sync or async) instead of repeating them.
+    """
+    if httpx is None:
+        return await asyncio.to_thread(api.request_arc_api, endpoint, params, cache_kind)
+
+    if not params:
+        params = {}
+    key = cache.make_key(endpoint, params)
+    flight, leader = api.join_flight(key)
+    if not leader:
+        return await flight.wait_async()
+    result = {"error": "Request canceled"}
+    try:
+        result = await _request_arc_api(endpoint, params, cache_kind)
+    finally:
+        result = api.land_flight(key, flight, result)
+    return result
+
+
+async def _request_arc_api(endpoint, params, cache_kind):
+    url = f"{api.ARC_API_BASE}{endpoint}"
+
+    ttl = cache.ttl_for(cache_kind) if cache_kind else 0
+    cache_key = cached_entry = None
+    if ttl > 0:
+        cache_key = cache.make_key(endpoint, params)
+        # the cache's disk tier does file I/O (and a prune on first use): keep it off the loop
+        data, cached_entry = await asyncio.to_thread(cache.lookup, cache_key)
+        if data is not None:
+            return data
+
+    attempts = 1 + max(0, gl.api_rate_limit_retries)
+    for attempt in range(attempts):
+        delay = api.rate_limit_delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            with http.tracked("api"):
+                r = await _get_client().get(url, params=params,
+                                            headers=cache.revalidation_headers(cached_entry))
+            if r.status_code == 429 and attempt + 1 < attempts:
+                api.note_rate_limited(r.headers.get("Retry-After"))
+                continue
+            if r.status_code in (500, 502, 503, 504) and attempt + 1 < attempts:
+                # Same transient-failure retry the sync session does in urllib3
+                await asyncio.sleep(gl.http_backoff_factor * (2 ** attempt))
+                continue
+            if r.status_code == 304 and cached_entry is not None:
+                return await asyncio.to_thread(cache.refresh, cache_key, cached_entry, ttl)
+            r.raise_for_status()
+            data = r.json()
+            if cache_key is not None and isinstance(data, dict) and "error" not in data:
+                await asyncio.to_thread(cache.store, cache_key, r.text, ttl,
+                                        etag=r.headers.get("ETag"),
+                                        last_modified=r.headers.get("Last-Modified"))
+            return data
+        except (httpx.HTTPError, ValueError) as e:
+            return {"error": str(e)}
+
+
+async def get_model_versions(model_id):
+    return await request_arc_api(f"/models/{model_id}/versions", cache_kind="versions")
+
+
+async def fetch_model_details(model_id):
+    return await request_arc_api(f"/models/{model_id}", cache_kind="model")
+
+
+async def get_model_gallery(model_id):
+    return await request_arc_api(f"/models/{model_id}/gallery", cache_kind="gallery")
+
+
+async def fetch_image_details(image_id):
+    return await request_arc_api(f"/images/{image_id}/info", cache_kind="image")
+
+
+async def fetch_model_details_with_gallery(model_id):
+    """Model details and its gallery, fetched concurrently. Returns (details, gallery)."""
+    return await asyncio.gather(fetch_model_details(model_id), get_model_gallery(model_id))
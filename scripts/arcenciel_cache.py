@@ -0,0 +1,194 @@
+# scripts/arcenciel_cache.py
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlencode
+
+import scripts.arcenciel_global as gl
+
+RESPONSE_CACHE_DIR = Path(__file__).parent.parent / "cache" / "responses"
+# ^ On-disk tier, under the extension root folder
+
+_lock = threading.Lock()
+_memory = OrderedDict()  # key -> entry, least recently used first
+_memory_bytes = 0
+_disk_pruned = False
+_stats = {"hits": 0, "disk_hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+# An entry is a dict:
+#   "body"          raw JSON text (parsed on every hit, so callers may mutate the result)
+#   "expires"       time.time() after which it must be revalidated
+#   "etag"          ETag header, if the server sent one
+#   "last_modified" Last-Modified header, if the server sent one
+#   "stored"        time.time() when it was fetched or last revalidated
+
+
+def make_key(endpoint, params=None):
+    """Stable cache key for an endpoint + query params."""
+    if not params:
+        return endpoint
+    return f"{endpoint}?{urlencode(sorted((k, str(v)) for k, v in params.items()))}"
+
+
+def ttl_for(kind):
+    return gl.response_cache_ttls.get(kind, 0)
+
+
+def _disk_path(key):
+    return RESPONSE_CACHE_DIR / (hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+
+def _prune_disk():
+    """Drop on-disk entries not touched within gl.response_cache_disk_max_age. Runs once per session."""
+    global _disk_pruned
+    _disk_pruned = True
+    if not RESPONSE_CACHE_DIR.is_dir():
+        return
+    cutoff = time.time() - gl.response_cache_disk_max_age
+    for entry in os.scandir(RESPONSE_CACHE_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _read_disk(key):
+    if not gl.response_cache_disk:
+        return None
+    if not _disk_pruned:
+        _prune_disk()
+    try:
+        with open(_disk_path(key), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        if entry.get("key") == key:
+            return entry
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _write_disk(key, entry):
+    if not gl.response_cache_disk:
+        return
+    try:
+        RESPONSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = _disk_path(key)
+        tmp_path = str(path) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(entry, key=key), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        gl.debug_print(f"Could not write response cache entry: {e}")
+
+
+def _remember(key, entry):
+    """Insert into the memory tier and evict least recently used entries. Needs _lock."""
+    global _memory_bytes
+    old = _memory.pop(key, None)
+    if old is not None:
+        _memory_bytes -= len(old["body"])
+    _memory[key] = entry
+    _memory_bytes += len(entry["body"])
+    while _memory and (
+        _memory_bytes > gl.response_cache_max_bytes or len(_memory) > gl.response_cache_max_entries
+    ):
+        _, evicted = _memory.popitem(last=False)
+        _memory_bytes -= len(evicted["body"])
+        _stats["evictions"] += 1
+
+
+def lookup(key):
+    """
+    Return (data, entry).
+      data  => parsed JSON if the entry is still fresh, else None
+      entry => the (possibly stale) entry, usable for conditional revalidation
+    """
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+    if entry is None:
+        entry = _read_disk(key)
+        if entry is not None:
+            with _lock:
+                _remember(key, entry)
+                if entry["expires"] > time.time():
+                    _stats["disk_hits"] += 1
+    if entry is None:
+        with _lock:
+            _stats["misses"] += 1
+        return None, None
+    if entry["expires"] > time.time():
+        with _lock:
+            _stats["hits"] += 1
+        return json.loads(entry["body"]), entry
+    with _lock:
+        _stats["misses"] += 1
+    return None, entry
+
+
+def revalidation_headers(entry):
+    """If-None-Match / If-Modified-Since headers for a stale entry."""
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def store(key, body, ttl, etag=None, last_modified=None):
+    now = time.time()
+    entry = {
+        "body": body,
+        "expires": now + ttl,
+        "etag": etag,
+        "last_modified": last_modified,
+        "stored": now,
+    }
+    with _lock:
+        _remember(key, entry)
+        _stats["stores"] += 1
+    _write_disk(key, entry)
+
+
+def refresh(key, entry, ttl):
+    """A 304 confirmed 'entry' is current: extend its lifetime and return the data."""
+    now = time.time()
+    entry = dict(entry, expires=now + ttl, stored=now)
+    with _lock:
+        _remember(key, entry)
+        _stats["revalidated"] += 1
+    _write_disk(key, entry)
+    return json.loads(entry["body"])
+
+
+def clear(disk=True):
+    global _memory_bytes
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+    if disk and RESPONSE_CACHE_DIR.is_dir():
+        for entry in os.scandir(RESPONSE_CACHE_DIR):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_memory)
+        stats["bytes"] = _memory_bytes
+    # A stale lookup counts as a miss; revalidated ones are the misses a 304 saved
+    lookups = stats["hits"] + stats["misses"]
+    served = stats["hits"] + stats["revalidated"]
+    stats["hit_ratio"] = round(served / lookups, 3) if lookups else 0.0
+    return stats
@@ -0,0 +1,84 @@
+# scripts/arcenciel_card_updates.py
+import time
+import uuid
+import asyncio
+import threading
+
+import scripts.arcenciel_global as gl
+
+# Per-search channels that carry small card patches ({"id": model_id, "src": url})
+# from the preview workers to the browser, instead of re-sending the whole gallery.
+# The browser long-polls /arcenciel/search_updates/{search_id}?since=N.
+
+CHANNEL_MAX_AGE = 300  # seconds; abandoned channels are dropped after this
+
+_lock = threading.Lock()
+_channels = {}  # search_id -> CardChannel
+
+
+class CardChannel:
+    def __init__(self, search_id):
+        self.search_id = search_id
+        self.created = time.time()
+        self.updates = []
+        self.done = False
+        self._lock = threading.Lock()
+        self._waiters = []  # (event loop, asyncio.Event) of pending long-polls
+
+    def _wake(self):
+        """Needs self._lock."""
+        for loop, event in self._waiters:
+            loop.call_soon_threadsafe(event.set)
+        self._waiters = []
+
+    def publish(self, model_id, src):
+        with self._lock:
+            self.updates.append({"id": model_id, "src": src})
+            self._wake()
+
+    def close(self):
+        with self._lock:
+            self.done = True
+            self._wake()
+
+    def read(self, cursor):
+        """Returns (updates since cursor, new cursor, done)."""
+        with self._lock:
+            return self.updates[cursor:], len(self.updates), self.done
+
+    async def wait(self, cursor, timeout):
+        """
+        Wait until there is something past 'cursor' (or the channel closes),
+        then linger gl.card_update_coalesce seconds so a burst of finished
+        previews goes out as one response.
+        """
+        event = asyncio.Event()
+        with self._lock:
+            if len(self.updates) > cursor or self.done:
+                return
+            self._waiters.append((asyncio.get_running_loop(), event))
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._waiters = [w for w in self._waiters if w[1] is not event]
+            return
+        if gl.card_update_coalesce > 0:
+            await asyncio.sleep(gl.card_update_coalesce)
+
+
+def open_channel():
+    """Create a channel for a new search, dropping stale ones."""
+    search_id = uuid.uuid4().hex[:16]
+    now = time.time()
+    with _lock:
+        for key in [k for k, ch in _channels.items() if now - ch.created > CHANNEL_MAX_AGE]:
+            del _channels[key]
+        channel = CardChannel(search_id)
+        _channels[search_id] = channel
+    return channel
+
+
+def get_channel(search_id):
+    with _lock:
+        return _channels.get(search_id)
@@ -0,0 +1,304 @@
+# scripts/arcenciel_catalog.py
+import re
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_api as api
+import scripts.arcenciel_http as http
+
+CATALOG_DB = Path(__file__).parent.parent / "catalog.db"
+# ^ This places catalog.db in the extension root folder, next to save_paths.txt
+
+# Optional offline mirror of the ArcEnCiel catalog, for the Browser tab's
+# "Search offline mirror" toggle. sync() pages through /models/search
+# (newest first) and stores each model as the API returned it, plus the
+# columns needed to search, filter and sort locally; search() answers in
+# the same shape as api.search_models. The mirror is only used while it is
+# fresher than gl.catalog_max_age, otherwise searches go to the live API.
+#
+# The API can only sort by upload date, so an incremental sync sees new
+# uploads but not edits to older models (new versions, tags, previews).
+# Those are picked up by a full sync, which an incremental one turns into
+# once the last full sync is older than gl.catalog_full_sync_interval.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    title TEXT,
+    type TEXT,
+    tags TEXT,
+    uploader TEXT,
+    preview_path TEXT,
+    data TEXT NOT NULL,
+    synced REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS model_base_models (
+    model_id INTEGER NOT NULL,
+    base_model TEXT NOT NULL,
+    PRIMARY KEY (model_id, base_model)
+);
+CREATE INDEX IF NOT EXISTS model_base_models_base ON model_base_models (base_model);
+CREATE INDEX IF NOT EXISTS models_type ON models (type);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Full-text index over the searchable columns, rowid = model id.
+# Python builds without FTS5 fall back to LIKE matching.
+_FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS models_fts USING fts5(title, tags, uploader, description)"
+
+_sync_lock = threading.Lock()
+_fts_available = None
+
+
+def _connect():
+    global _fts_available
+    conn = sqlite3.connect(str(CATALOG_DB), timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    if _fts_available is None or _fts_available:
+        try:
+            conn.execute(_FTS_SCHEMA)
+            _fts_available = True
+        except sqlite3.OperationalError as e:
+            gl.debug_print(f"SQLite has no FTS5, offline search falls back to LIKE: {e}")
+            _fts_available = False
+    return conn
+
+
+def _get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def _base_models(item):
+    return sorted({v.get("baseModel") for v in item.get("versions") or [] if v.get("baseModel")})
+
+
+def _upsert(conn, item, now):
+    """Store one model from a search response. Returns "new", "changed" or "same"."""
+    model_id = int(item["id"])
+    data = json.dumps(item, sort_keys=True)
+    row = conn.execute("SELECT data FROM models WHERE id = ?", (model_id,)).fetchone()
+    if row and row[0] == data:
+        conn.execute("UPDATE models SET synced = ? WHERE id = ?", (now, model_id))
+        return "same"
+
+    tags = " ".join(t.get("name", "") for t in item.get("tags") or [] if isinstance(t, dict))
+    uploader = (item.get("uploader") or {}).get("username", "")
+    conn.execute(
+        "INSERT OR REPLACE INTO models (id, title, type, tags, uploader, preview_path, data, synced) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (model_id, item.get("title", ""), (item.get("type") or "").upper(), tags, uploader,
+         api.preview_file_path(item), data, now),
+    )
+    conn.execute("DELETE FROM model_base_models WHERE model_id = ?", (model_id,))
+    conn.executemany("INSERT INTO model_base_models (model_id, base_model) VALUES (?, ?)",
+                     [(model_id, base) for base in _base_models(item)])
+    if _fts_available:
+        conn.execute("DELETE FROM models_fts WHERE rowid = ?", (model_id,))
+        conn.execute(
+            "INSERT INTO models_fts (rowid, title, tags, uploader, description) VALUES (?, ?, ?, ?, ?)",
+            (model_id, item.get("title", ""), tags, uploader, item.get("description") or ""),
+        )
+    return "changed" if row else "new"
+
+
+def _gone_upstream(model_id):
+    """
+    True only if the API answers 404 for the model. Any other answer, or no
+    answer at all, keeps it in the mirror.
+    """
+    delay = api.rate_limit_delay()
+    if delay > 0:
+        time.sleep(delay)
+    try:
+        with http.get(f"{api.ARC_API_BASE}/models/{model_id}", kind="api") as r:
+            if r.status_code == 429:
+                api.note_rate_limited(r.headers.get("Retry-After"))
+            return r.status_code == 404
+    except Exception as e:
+        gl.debug_print(f"Could not re-check model {model_id}: {e}")
+        return False
+
+
+def _delete_unseen(conn, since):
+    """
+    Drop models a full sync didn't see, once the API confirms they are gone.
+    A model can also go unseen because uploads or removals shifted the pages
+    while the sync walked them, so none is dropped on absence alone.
+    Returns how many were dropped.
+    """
+    ids = [r[0] for r in conn.execute("SELECT id FROM models WHERE synced < ?", (since,))]
+    removed = 0
+    for model_id in ids:
+        if not _gone_upstream(model_id):
+            continue
+        with conn:
+            conn.execute("DELETE FROM models WHERE id = ?", (model_id,))
+            conn.execute("DELETE FROM model_base_models WHERE model_id = ?", (model_id,))
+            if _fts_available:
+                conn.execute("DELETE FROM models_fts WHERE rowid = ?", (model_id,))
+        removed += 1
+        time.sleep(gl.catalog_sync_delay)
+    return removed
+
+
+def sync(full=False):
+    """
+    Generator: mirror the catalog into catalog.db, yielding progress lines.
+    An incremental sync walks the newest models and stops after
+    gl.catalog_sync_quiet_pages pages in a row with nothing new or changed;
+    a full sync walks every page and then drops models that are gone
+    upstream. The first sync, and any after gl.catalog_full_sync_interval
+    without a full one, is a full sync.
+    """
+    if not _sync_lock.acquire(blocking=False):
+        yield "A catalog sync is already running."
+        return
+    try:
+        conn = _connect()
+        try:
+            last_full = float(_get_meta(conn, "last_full_sync", 0))
+            full = (full or not conn.execute("SELECT 1 FROM models LIMIT 1").fetchone()
+                    or time.time() - last_full >= gl.catalog_full_sync_interval)
+            if full:
+                yield "Full sync: every page is checked, removed models are dropped."
+            started = time.time()
+            counts = {"new": 0, "changed": 0, "same": 0}
+            quiet_pages = 0
+            walked_all = False
+            page = 1
+            while True:
+                resp = api.request_arc_api("/models/search", {
+                    "search": "",
+                    "sort": "newest",
+                    "page": page,
+                    "limit": gl.catalog_sync_page_size,
+                })
+                if "error" in resp:
+                    yield f"Sync stopped on page {page}: {resp['error']}"
+                    return
+                items = resp.get("data") or []
+                total_pages = resp.get("totalPages", 1) or 1
+                page_counts = {"new": 0, "changed": 0, "same": 0}
+                with conn:
+                    for item in items:
+                        if isinstance(item, dict) and item.get("id") is not None:
+                            page_counts[_upsert(conn, item, started)] += 1
+                for key, value in page_counts.items():
+                    counts[key] += value
+                yield (f"Page {page}/{total_pages}: {page_counts['new']} new, "
+                       f"{page_counts['changed']} changed")
+
+                if not items or page >= total_pages:
+                    walked_all = page >= total_pages
+                    break
+                if not full:
+                    quiet_pages = 0 if page_counts["new"] or page_counts["changed"] else quiet_pages + 1
+                    if quiet_pages >= gl.catalog_sync_quiet_pages:
+                        break
+                page += 1
+                time.sleep(gl.catalog_sync_delay)  # stay well clear of the API's rate limit
+
+            # An empty page before the last one means the walk was cut short:
+            # most of the mirror would look unseen, so nothing is re-checked
+            removed = _delete_unseen(conn, started) if full and walked_all else 0
+            with conn:
+                _set_meta(conn, "last_sync", started)
+                if full and walked_all:
+                    _set_meta(conn, "last_full_sync", started)
+            yield (f"Catalog synced: {counts['new']} new, {counts['changed']} changed, "
+                   f"{removed} removed, {model_count()} models in the mirror.")
+        finally:
+            conn.close()
+    finally:
+        _sync_lock.release()
+
+
+def last_sync():
+    """time.time() of the last completed sync, or None."""
+    if not CATALOG_DB.exists():
+        return None
+    conn = _connect()
+    try:
+        value = _get_meta(conn, "last_sync")
+    finally:
+        conn.close()
+    return float(value) if value else None
+
+
+def is_fresh():
+    """True if the mirror has been synced within gl.catalog_max_age."""
+    synced = last_sync()
+    return synced is not None and time.time() - synced < gl.catalog_max_age
+
+
+def model_count():
+    if not CATALOG_DB.exists():
+        return 0
+    conn = _connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM models").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def search(search_term="", sort="newest", page=1, limit=12, base_model="", model_type=""):
+    """Local twin of api.search_models: same arguments, same response shape."""
+    conn = _connect()  # also settles whether FTS5 is there
+    where, args = [], []
+    terms = re.findall(r"\w+", search_term or "")
+    if terms:
+        if _fts_available:
+            where.append("m.id IN (SELECT rowid FROM models_fts WHERE models_fts MATCH ?)")
+            args.append(" ".join(f'"{t}"*' for t in terms))
+        else:
+            for t in terms:
+                where.append("(m.title LIKE ? OR m.tags LIKE ? OR m.uploader LIKE ?)")
+                args.extend([f"%{t}%"] * 3)
+    if base_model:
+        where.append("m.id IN (SELECT model_id FROM model_base_models WHERE base_model = ?)")
+        args.append(base_model)
+    if model_type:
+        where.append("m.type = ?")
+        args.append(model_type.upper())
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    order = "ASC" if sort == "oldest" else "DESC"  # ids grow with each upload
+    limit = max(1, int(limit))
+    page = max(1, int(page))
+
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM models m {where_sql}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT m.data FROM models m {where_sql} ORDER BY m.id {order} LIMIT ? OFFSET ?",
+            args + [limit, (page - 1) * limit],
+        ).fetchall()
+    except sqlite3.Error as e:
+        return {"error": str(e)}
+    finally:
+        conn.close()
+    return {
+        "data": [json.loads(row[0]) for row in rows],
+        "total": total,
+        "totalPages": max(1, (total + limit - 1) // limit),
+    }
+
+
+def get_stats():
+    synced = last_sync()
+    return {
+        "models": model_count(),
+        "last_sync_age": round(time.time() - synced) if synced else None,
+        "fresh": is_fresh(),
+    }
@@ -1,120 +1,992 @@
 # scripts/arcenciel_download.py
 
 import os
+import json
 import time
+import errno
+import shutil
+import hashlib
 import threading
-import requests
 import tqdm
 import scripts.arcenciel_global as gl
+import scripts.arcenciel_http as http
+import scripts.arcenciel_hash_cache as hash_cache
+import scripts.arcenciel_library as library
+import scripts.arcenciel_journal as journal
+from scripts.arcenciel_hashing import hash_file
 from threading import Lock
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 
 # We'll store a reference to the queue-level tqdm bar in a global var.
 queue_pbar = None
 queue_pbar_lock = Lock()
 
-def queue_download(model_id, version_id, file_url, filename):
+# Scheduler state, guarded by _cond:
+#   "idle"     => no dispatcher thread
+#   "running"  => dispatcher hands queued items to gl.executor as slots free up
+# Items move queued -> active -> completed / canceled / failed / quarantined.
+# Pausing sends a queued or active item to "paused" (its .part is kept and
+# its slot freed); resuming puts it back in the queue.
+_cond = threading.Condition()
+_state = "idle"
+_active_by_host = {}
+_active_total = 0
+
+FINAL_STATES = ("completed", "canceled", "failed", "quarantined")
+_stats = {"coalesced": 0}
+
+
+class TokenBucket:
+    """
+    Bytes-per-second limiter. consume() never refuses: it takes the tokens,
+    going into debt if a chunk is bigger than the balance, and sleeps until
+    the debt is paid, so chunk size doesn't matter. The rate comes from
+    'rate_func' on every call, so limits changed at runtime apply to
+    transfers that are already running. A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate_func, burst_seconds=1.0):
+        self._rate_func = rate_func
+        self._burst_seconds = burst_seconds
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n, stop_event=None):
+        rate = self._rate_func()
+        if not rate or rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(rate * self._burst_seconds, self._tokens + (now - self._last) * rate)
+            self._last = now
+            self._tokens -= n
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            if stop_event is not None:
+                stop_event.wait(wait)  # a pause/cancel cuts the wait short
+            else:
+                time.sleep(wait)
+
+
+def _global_rate():
     """
-    Adds an item to the global download_queue.
+    Cap shared by all downloads. While API/thumbnail requests are in flight
+    (the reserved lane), gl.interactive_reserved_rate of it is held back.
+    """
+    limit = gl.download_rate_limit
+    if limit and gl.interactive_reserved_rate and http.interactive_active():
+        limit = max(gl.download_min_rate, limit - gl.interactive_reserved_rate)
+    return limit
+
+def _item_rate(item):
+    rate = item.get("rate_limit")
+    return gl.download_item_rate_limit if rate is None else rate
+
+_global_bucket = TokenBucket(_global_rate)
+
+def _throttle(item, n):
+    """Wait until 'n' more bytes fit both the item's own cap and the global one."""
+    item["bucket"].consume(n, item["stop"])
+    _global_bucket.consume(n, item["stop"])
+
+
+class DownloadHandle:
+    """
+    Control over one download, kept in gl.futures_map under its key.
+    'future' resolves to the final status; a paused download's stays pending.
+    """
+
+    def __init__(self, item):
+        self.key = item["key"]
+        self.item = item
+        self.future = item["future"]
+
+    @property
+    def status(self):
+        return self.item["status"]
+
+    def cancel(self):
+        return cancel_download(self.key)
+
+    def pause(self):
+        return pause_download(self.key)
+
+    def resume(self):
+        return resume_download(self.key)
+
+
+def download_key(model_id, version_id):
+    """Key of a download in gl.futures_map."""
+    return f"{model_id}:{version_id}"
+
+def _priority_for(model_type, priority):
+    """Lower runs first. Explicit priority wins, else it's derived from the model type."""
+    if priority is not None:
+        try:
+            return int(priority)
+        except (TypeError, ValueError):
+            pass
+    return gl.download_priority_by_type.get((model_type or "").upper(), gl.download_default_priority)
+
+def queue_download(model_id, version_id, file_url, filename, model_type=None, priority=None,
+                   expected_sha256=()):
+    """
+    Adds an item to the global download_queue and tracks it in gl.futures_map.
     Increments the queue_pbar total if it exists.
+    'expected_sha256' lists the digests the finished file may have (the version's
+    sha256 / sha256webui); anything else is quarantined.
+    A request for a key that is already queued, active or paused is coalesced
+    into that download (resuming it if paused) instead of fetching twice.
+    Returns the item's DownloadHandle.
     """
+    item = _new_item(model_id, version_id, file_url, filename, model_type,
+                     _priority_for(model_type, priority), expected_sha256)
+    handle = _track(item, queued=True, coalesce=True)
+    if handle.item is not item:
+        if handle.status == "paused":
+            handle.resume()
+        return handle
+
+    # If we already have a queue_pbar, increment its total by 1
+    with queue_pbar_lock:
+        if queue_pbar is not None:
+            queue_pbar.total += 1
+            queue_pbar.refresh()
+    return handle
+
+def _new_item(model_id, version_id, file_url, filename, model_type, priority, expected_sha256):
     item = {
+        "key": download_key(model_id, version_id),
         "model_id": model_id,
         "version_id": version_id,
         "file_url": file_url,
         "filename": filename,
+        "model_type": model_type,
+        "priority": priority,
+        "host": urlparse(file_url).netloc.lower(),
+        "expected_sha256": [h.lower() for h in expected_sha256 or () if h],
+        "status": "queued",
+        "future": Future(),
+        # Set to stop this item; "stop_reason" says how it ends: "pause", "cancel",
+        # or "resume" (a pause taken back before the transfer stopped)
+        "stop": threading.Event(),
+        "stop_reason": None,
+        "rate_limit": None,   # bytes/s for this item; None => gl.download_item_rate_limit
+        "bucket": None,
+        # Progress, read by arcenciel_download_status
+        "bytes_done": 0,      # bytes of the file on disk
+        "total": None,        # expected size, once the server told us
+        "transferred": 0,     # bytes received this session (for the average rate)
+        "started": None,      # time.monotonic() when it became active
+        "finished": None,
+        "error": None,
     }
-    gl.download_queue.append(item)
+    item["bucket"] = TokenBucket(lambda: _item_rate(item))
+    return item
+
+def set_download_rate_limit(key, rate):
+    """
+    Cap one download at 'rate' bytes/s (0 = unlimited, None = the default
+    gl.download_item_rate_limit). Applies immediately, even mid-transfer.
+    Returns False if the key is unknown.
+    """
+    handle = gl.futures_map.get(key)
+    if handle is None:
+        return False
+    handle.item["rate_limit"] = None if rate is None else max(0, int(rate))
+    return True
+
+def _track(item, queued, coalesce=False):
+    """
+    Register an item in gl.futures_map (and the queue, if 'queued'). Returns its
+    handle; with 'coalesce', an unfinished download of the same key wins and
+    its handle is returned instead.
+    """
+    handle = DownloadHandle(item)
+    with _cond:
+        existing = gl.futures_map.get(item["key"])
+        if coalesce and existing is not None and existing.status not in FINAL_STATES:
+            _stats["coalesced"] += 1
+            return existing
+        if queued:
+            gl.download_queue.push(item)
+        # Re-queuing a key moves it to the end of the (insertion-ordered) map
+        gl.futures_map.pop(item["key"], None)
+        gl.futures_map[item["key"]] = handle
+        journal.record(item)
+        _trim_history()
+        _cond.notify_all()
     #gl.debug_print(f"Queued download: {item}")
+    return handle
 
-    # If we already have a queue_pbar, increment its total by 1
+def _part_progress(url, part_path, meta_path):
+    """Bytes a resume of this .part would keep, for display."""
+    meta = _load_part_meta(meta_path)
+    if not meta or not os.path.exists(part_path):
+        return 0
+    if meta.get("segmented"):
+        size, seg_size = meta.get("expected_length") or 0, meta.get("segment_size") or 1
+        done = sum(min(seg_size, size - i * seg_size) for i in meta.get("done_segments", []))
+        return done + sum(meta.get("partial_segments", {}).values())
+    return _resume_offset(url, part_path, meta)
+
+_restored = False
+
+def restore_downloads():
+    """
+    Re-queue what the journal says was unfinished when WebUI last stopped.
+    Once per process (on_app_started also fires on UI reloads).
+    Reconciled against the disk: a finished file with no .part left means the
+    download completed just before the restart; anything else resumes from
+    its .part, or starts over if there is none. Paused downloads stay paused.
+    Returns how many downloads were re-queued.
+    """
+    global _restored
+    if _restored:
+        return 0
+    _restored = True
+    journal.prune()
+
+    requeued = 0
+    for row in journal.load_unfinished():
+        if row["key"] in gl.futures_map:
+            continue
+        item = _new_item(row["model_id"], row["version_id"], row["file_url"], row["filename"],
+                         row["model_type"], row["priority"], row["expected_sha256"])
+        item["total"] = row["total"]
+        part_path, meta_path = _part_paths(item["filename"])
+
+        if os.path.exists(item["filename"]) and not os.path.exists(part_path):
+            item["status"] = "completed"
+            item["future"].set_result("completed")
+            _track(item, queued=False)
+            continue
+
+        item["bytes_done"] = _part_progress(item["file_url"], part_path, meta_path)
+        if row["status"] == "paused":
+            item["status"] = "paused"
+            item["stop_reason"] = "pause"
+            _track(item, queued=False)
+        else:
+            _track(item, queued=True)
+            requeued += 1
+
+    if requeued:
+        gl.debug_print(f"Restored {requeued} unfinished download(s) from the journal.")
+        start_downloads()
+    return requeued
+
+def _trim_history():
+    """Forget the oldest finished downloads beyond gl.download_history_size. Needs _cond."""
+    finished = [key for key, handle in gl.futures_map.items() if handle.status in FINAL_STATES]
+    for key in finished[:max(0, len(finished) - gl.download_history_size)]:
+        del gl.futures_map[key]
+
+def list_downloads():
+    """Items of every tracked download (queued, active, paused, recently finished), oldest first."""
+    with _cond:
+        return [handle.item for handle in gl.futures_map.values()]
+
+def _set_status(item, status):
+    """Change an item's status and journal it. Needs _cond."""
+    item["status"] = status
+    journal.record(item)
+
+def _resolve(item, status):
+    """Put an item in a final state and resolve its future. Needs _cond."""
+    _set_status(item, status)
+    future = item["future"]
+    if not future.done():
+        future.set_result(status)
+
+def _request_stop(item, reason):
+    """Ask an active item's transfer to stop at its next chunk. Needs _cond."""
+    if item["stop_reason"] != "cancel":
+        item["stop_reason"] = reason
+    item["stop"].set()
+
+def cancel_download(key):
+    """
+    Cancel one download. A queued or paused item is dropped at once; an
+    active one stops at its next chunk, leaving its .part for a later retry.
+    Returns False if there was nothing to cancel.
+    """
+    with _cond:
+        handle = gl.futures_map.get(key)
+        if handle is None:
+            return False
+        item = handle.item
+        if item["status"] == "queued":
+            gl.download_queue.remove(key)
+            _resolve(item, "canceled")
+        elif item["status"] == "paused":
+            _resolve(item, "canceled")
+        elif item["status"] == "active":
+            _request_stop(item, "cancel")
+        else:
+            return False
+        _cond.notify_all()
     with queue_pbar_lock:
-        if queue_pbar is not None:
-            queue_pbar.total += 1
-            queue_pbar.refresh()
+        if queue_pbar is not None and item["status"] == "canceled":
+            queue_pbar.update(1)
+    return True
 
-def start_downloads():
-    if gl.isDownloading:
-        return
+def pause_download(key):
+    """
+    Pause one download, freeing its slot for the next queued item. Bytes
+    already fetched stay in the .part, so resume_download continues from there.
+    Returns False if the download isn't queued or active.
+    """
+    with _cond:
+        handle = gl.futures_map.get(key)
+        if handle is None:
+            return False
+        item = handle.item
+        if item["status"] == "queued":
+            gl.download_queue.remove(key)
+            _set_status(item, "paused")
+            item["stop_reason"] = "pause"
+        elif item["status"] == "active" and item["stop_reason"] in (None, "resume"):
+            _request_stop(item, "pause")
+        else:
+            return False
+        _cond.notify_all()
+    return True
+
+def resume_download(key):
+    """Put a paused download back in the queue. Returns False if it wasn't paused."""
+    with _cond:
+        handle = gl.futures_map.get(key)
+        if handle is None:
+            return False
+        item = handle.item
+        if item["status"] == "active" and item["stop_reason"] == "pause":
+            # Still winding down: the transfer stops as for a pause (its stop event
+            # stays set) and _run_item re-queues it once it returns
+            item["stop_reason"] = "resume"
+            return True
+        if item["status"] != "paused":
+            return False
+        item["stop_reason"] = None
+        item["stop"].clear()
+        _set_status(item, "queued")
+        gl.download_queue.push(item)
+        _cond.notify_all()
+    start_downloads()
+    return True
 
-    gl.isDownloading = True
+def _host_is_busy(host):
+    return _active_by_host.get(host, 0) >= gl.download_per_host_limit
 
-    def download_worker():
-        global queue_pbar
-        with tqdm.tqdm(total=0, desc="Queue", ascii=True, position=0, dynamic_ncols=True) as pbar:
+def _pick_next():
+    """
+    Take the next runnable item off the queue, or None. Needs _cond.
+    Lower priority values go first, so small models jump ahead of checkpoints;
+    see DownloadQueue for the per-host fairness within a priority.
+    """
+    global _active_total
+    if _active_total >= gl.download_max_concurrent:
+        return None
+    item = gl.download_queue.pop_runnable(_host_is_busy)
+    if item is None:
+        return None
+    _active_by_host[item["host"]] = _active_by_host.get(item["host"], 0) + 1
+    _active_total += 1
+    _set_status(item, "active")
+    return item
+
+def _run_item(item):
+    global _active_total
+    future = item["future"]
+    status = None
+    try:
+        # A resumed item's future is already running
+        if not future.running() and not future.set_running_or_notify_cancel():
+            status = "canceled"
+            return
+        item["started"] = time.monotonic()
+        item["transferred"] = 0
+        try:
+            status = do_download(item)
+        except Exception as e:
+            item["error"] = str(e)
+            status = "failed"
+    finally:
+        item["finished"] = time.monotonic()
+        with _cond:
+            _active_by_host[item["host"]] -= 1
+            _active_total -= 1
+            if status == "paused" and item["stop_reason"] == "resume":
+                # Resumed before the transfer finished pausing
+                item["stop_reason"] = None
+                item["stop"].clear()
+                _set_status(item, "queued")
+                gl.download_queue.push(item)
+            elif status == "paused" and item["stop_reason"] == "pause":
+                _set_status(item, "paused")
+            else:
+                if status == "paused":
+                    status = "canceled"  # canceled while pausing
+                _resolve(item, status)
+            _trim_history()
+            _cond.notify_all()
+        if item["status"] in FINAL_STATES:
             with queue_pbar_lock:
-                queue_pbar = pbar
+                if queue_pbar is not None:
+                    queue_pbar.update(1)
 
-            while True:
-                if gl.cancel_status:
-                    # user canceled => break
-                    break
+def _dispatch_loop():
+    """Dispatcher thread body. Sleeps on _cond until an enqueue or a finished download."""
+    global queue_pbar, _state
+    with tqdm.tqdm(total=len(gl.download_queue), desc="Queue", ascii=True, position=0, dynamic_ncols=True) as pbar:
+        with queue_pbar_lock:
+            queue_pbar = pbar
 
-                if not gl.download_queue:
-                    time.sleep(0.2)
-                    if not gl.download_queue and not gl.cancel_status:
-                        # no new items arrived => done
-                        break
+        with _cond:
+            while True:
+                item = _pick_next()
+                if item is not None:
+                    gl.executor.submit(_run_item, item)
                     continue
 
-                item = gl.download_queue.pop(0)
-                do_download(item)
-                pbar.update(1)
+                if not len(gl.download_queue) and not _active_total:
+                    # queue is empty and nothing is running => done
+                    # (paused items wait for resume_download to restart us)
+                    break
+                _cond.wait()
 
-            # either queue is empty or user canceled
+            _state = "idle"
             gl.isDownloading = False
-            with queue_pbar_lock:
-                queue_pbar = None
 
-            # Now that we’re done or canceled, reset for next time
-            gl.cancel_status = False
+        with queue_pbar_lock:
+            queue_pbar = None
 
-    t = threading.Thread(target=download_worker, daemon=True)
+def start_downloads():
+    """Start the dispatcher unless it's already running. Safe to call from any thread."""
+    global _state
+    with _cond:
+        if _state != "idle":
+            # The running dispatcher was already woken by queue_download
+            return
+        _state = "running"
+        gl.isDownloading = True
+
+    t = threading.Thread(target=_dispatch_loop, daemon=True)
     t.start()
 
+def get_stats():
+    with _cond:
+        return dict(_stats)
+
+def get_download_status(key):
+    """
+    Status of a tracked download: queued, active, paused, completed, canceled,
+    failed, quarantined; None if unknown.
+    """
+    handle = gl.futures_map.get(key)
+    if handle is None:
+        return None
+    return handle.status
+
+def _part_paths(filename):
+    """Staging file and its metadata record for 'filename'."""
+    return filename + ".part", filename + ".part.json"
+
+def _load_part_meta(meta_path):
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_part_meta(meta_path, meta):
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+def _discard_part(part_path, meta_path):
+    for path in (part_path, meta_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _resume_offset(url, part_path, meta):
+    """Bytes already on a single-stream .part that belong to this exact URL, else 0."""
+    # A segmented .part is preallocated, so its size says nothing about progress
+    if meta and meta.get("url") == url and not meta.get("segmented") and os.path.exists(part_path):
+        size = os.path.getsize(part_path)
+        if meta.get("preallocated"):
+            # Same for a preallocated single stream: trust the last recorded position
+            return min(size, int(meta.get("bytes_done") or 0))
+        return size
+    return 0
+
+def _check_free_space(path, needed):
+    """Raise ENOSPC up front if writing 'needed' more bytes next to 'path' won't fit."""
+    if needed <= 0:
+        return
+    free = shutil.disk_usage(os.path.dirname(os.path.abspath(path))).free
+    if free - needed < gl.download_free_space_margin:
+        raise OSError(errno.ENOSPC,
+                      f"not enough free space for {os.path.basename(path)}: "
+                      f"needs {needed} bytes, {free} available")
+
+def _preallocate(f, size):
+    """
+    Reserve 'size' bytes for the open file 'f', so the drive can't fill up
+    mid-download. Raises ENOSPC if the space isn't there.
+    """
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise OSError(errno.ENOSPC,
+                              f"not enough free space for {os.path.basename(f.name)}: "
+                              f"could not reserve {size} bytes") from e
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+                raise
+            # Not supported by this filesystem: fall back to a sparse file
+    f.truncate(size)
+
+def _iter_body(r):
+    """
+    Yield the body of a streamed response in large chunks read straight from
+    the socket. The read size doubles or halves so each read takes about
+    gl.download_chunk_target_seconds: few Python-level iterations on fast links,
+    still responsive to cancel on slow ones.
+    """
+    chunk_min = max(1, int(gl.download_chunk_min))
+    chunk_max = max(chunk_min, int(gl.download_chunk_max))
+    target = gl.download_chunk_target_seconds
+    size = chunk_min
+    raw = r.raw
+    while True:
+        started = time.perf_counter()
+        data = raw.read(size, decode_content=True)
+        if not data:
+            return
+        yield data
+        elapsed = time.perf_counter() - started
+        if elapsed < target / 2 and len(data) == size:
+            size = min(chunk_max, size * 2)
+        elif elapsed > target * 2:
+            size = max(chunk_min, size // 2)
+
+def _resume_hasher(item, part_path, offset):
+    """
+    sha256 object covering the first 'offset' bytes of 'part_path'. Reuses the
+    one the previous attempt left behind when it stopped exactly there,
+    otherwise rereads that prefix from disk.
+    """
+    kept = item.pop("_hasher", None)
+    if kept and kept[0] == offset:
+        return kept[1]
+    sha = hashlib.sha256()
+    if offset:
+        with open(part_path, "rb") as f:
+            left = offset
+            while left:
+                data = f.read(min(left, gl.download_chunk_max))
+                if not data:
+                    raise IOError(f"{part_path} is shorter than its recorded {offset} bytes")
+                sha.update(data)
+                left -= len(data)
+    return sha
+
+def _transfer_single(url, filename, part_path, meta_path, item):
+    """
+    One attempt at fetching 'url' into 'part_path', resuming from whatever is
+    already there. The body is hashed as it streams in; on success the digest
+    is left in item["sha256"]. Returns "completed" or "canceled"; raises on errors.
+    """
+    meta = _load_part_meta(meta_path)
+    offset = _resume_offset(url, part_path, meta)
+    item.pop("segments", None)  # left by an earlier segmented attempt
+
+    headers = {}
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+        # Only resume if the remote file is still the one we started on
+        validator = meta.get("etag") or meta.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    # 'with' closes the response, returning its keep-alive connection to the pool
+    with http.get(url, kind="download", stream=True, headers=headers) as r:
+        if r.status_code == 416 and offset:
+            if offset == meta.get("expected_length"):
+                # Everything was already downloaded before the interruption
+                return "completed"
+            # The .part doesn't fit the remote file any more (changed upstream,
+            # or longer than it): every resume would fail the same way
+            gl.debug_print(f"{os.path.basename(filename)}: server refused to resume at {offset}, starting over")
+            r.close()
+            _discard_part(part_path, meta_path)
+            item.pop("_hasher", None)
+            return _transfer_single(url, filename, part_path, meta_path, item)
+        r.raise_for_status()
+
+        if offset and r.status_code == 206 and r.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+            mode = "r+b"
+            preallocated = bool(meta.get("preallocated"))
+        else:
+            # Server ignored the range (or the file changed): start over
+            offset = 0
+            mode = "wb"
+            preallocated = False
+
+        body_size = int(r.headers.get('content-length', 0))
+        total_size = offset + body_size if body_size else 0
+        on_disk = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        _check_free_space(part_path, total_size - on_disk)
+        item["total"] = total_size or None
+        item["bytes_done"] = offset
+
+        with open(part_path, mode) as f:
+            if mode == "wb" and total_size and gl.download_preallocate:
+                _preallocate(f, total_size)
+                preallocated = True
+            f.seek(offset)
+            meta = {
+                "url": url,
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "expected_length": total_size or None,
+                "preallocated": preallocated,
+                "bytes_done": offset,
+            }
+            _save_part_meta(meta_path, meta)
+
+            sha = _resume_hasher(item, part_path, offset)
+            pos = offset
+            pending = 0
+            last_report = time.monotonic()
+
+            def record_position():
+                # The file may be longer than what was written, so the
+                # position in the record is what a resume trusts
+                if preallocated:
+                    f.flush()
+                    meta["bytes_done"] = pos
+                    _save_part_meta(meta_path, meta)
+
+            # file-level bar
+            with tqdm.tqdm(
+                total=total_size,
+                initial=offset,
+                unit='B',
+                unit_scale=True,
+                desc=os.path.basename(filename),
+                ascii=True,
+                position=1,
+                dynamic_ncols=True,
+                mininterval=gl.download_progress_interval
+            ) as pbar:
+                try:
+                    for chunk in _iter_body(r):
+                        if item["stop"].is_set():
+                            #gl.debug_print("Download stopped mid-file.")
+                            return "canceled"
+                        f.write(chunk)
+                        sha.update(chunk)
+                        pos += len(chunk)
+                        item["bytes_done"] = pos
+                        item["transferred"] += len(chunk)
+                        _throttle(item, len(chunk))
+                        pending += len(chunk)
+                        now = time.monotonic()
+                        if now - last_report >= gl.download_progress_interval:
+                            pbar.update(pending)
+                            pending = 0
+                            last_report = now
+                            record_position()
+                finally:
+                    pbar.update(pending)
+                    record_position()
+                    # Lets the next attempt continue the hash instead of rereading the .part
+                    item["_hasher"] = (pos, sha)
+
+            if total_size and pos != total_size:
+                raise IOError(f"connection closed at {pos} of {total_size} bytes")
+            # Drop any preallocated tail (the server sent less than it announced)
+            f.truncate(pos)
+    item.pop("_hasher", None)
+    item["sha256"] = sha.hexdigest()
+    return "completed"
+
+def _probe_ranges(url):
+    """
+    Ask for the first byte to learn whether the server honors ranges.
+    Returns {"url": final URL after redirects, "size", "etag", "last_modified"}
+    or None if it doesn't.
+    """
+    with http.get(url, kind="download", stream=True, headers={"Range": "bytes=0-0"}) as r:
+        if r.status_code != 206:
+            return None
+        content_range = r.headers.get("Content-Range", "")  # "bytes 0-0/12345"
+        if not content_range.startswith("bytes 0-0/"):
+            return None
+        try:
+            size = int(content_range.rsplit("/", 1)[1])
+        except ValueError:
+            return None
+        return {
+            "url": r.url,
+            "size": size,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+        }
+
+def _fetch_segment(seg_url, part_path, index, start, end, validator, progress, item, pbar, pbar_lock):
+    """
+    Fetch bytes [start, end] into the preallocated 'part_path' at the same offset,
+    skipping the progress[index] bytes an earlier attempt already wrote.
+    Returns False if the item was stopped.
+    """
+    if item["stop"].is_set():
+        return False
+    begin = start + progress[index]
+    headers = {"Range": f"bytes={begin}-{end}"}
+    if validator:
+        headers["If-Range"] = validator
+    with http.get(seg_url, kind="download", stream=True, headers=headers) as r:
+        r.raise_for_status()
+        if r.status_code != 206 or not r.headers.get("Content-Range", "").startswith(f"bytes {begin}-"):
+            raise IOError(f"segment {index}: server did not honor the range")
+        pos = begin
+        pending = 0
+        last_report = time.monotonic()
+        with open(part_path, "r+b") as f:
+            f.seek(pos)
+            try:
+                for chunk in _iter_body(r):
+                    if item["stop"].is_set():
+                        return False
+                    f.write(chunk)
+                    pos += len(chunk)
+                    progress[index] = pos - start
+                    pending += len(chunk)
+                    with pbar_lock:
+                        item["bytes_done"] += len(chunk)
+                        item["transferred"] += len(chunk)
+                    _throttle(item, len(chunk))
+                    now = time.monotonic()
+                    if now - last_report >= gl.download_progress_interval:
+                        with pbar_lock:
+                            pbar.update(pending)
+                        pending = 0
+                        last_report = now
+            finally:
+                with pbar_lock:
+                    pbar.update(pending)
+    if pos != end + 1:
+        raise IOError(f"segment {index}: connection closed at {pos - start} of {end - start + 1} bytes")
+    return True
+
+def _transfer_segmented(url, filename, part_path, meta_path, probe, item):
+    """
+    Fetch 'url' as fixed-size byte ranges over gl.download_connections parallel
+    connections, straight into a preallocated .part file. Finished segments, and
+    how far unfinished ones got, are recorded in the .part.json record, so a
+    resume only fetches what's missing.
+    Returns "completed" or "canceled"; raises if a segment fails.
+    """
+    size = probe["size"]
+    seg_size = max(1, int(gl.download_segment_size))
+    segments = [(i, start, min(start + seg_size, size) - 1)
+                for i, start in enumerate(range(0, size, seg_size))]
+
+    meta = _load_part_meta(meta_path)
+    done = set()
+    partial = {}
+    if (meta and meta.get("segmented") and meta.get("url") == url
+            and meta.get("expected_length") == size and meta.get("segment_size") == seg_size
+            and meta.get("etag") == probe["etag"] and os.path.exists(part_path)):
+        done = set(meta.get("done_segments", []))
+        partial = meta.get("partial_segments", {})
+    else:
+        meta = {
+            "url": url,
+            "etag": probe["etag"],
+            "last_modified": probe["last_modified"],
+            "expected_length": size,
+            "segmented": True,
+            "segment_size": seg_size,
+            "done_segments": [],
+        }
+        # Preallocate so every segment can write at its own offset
+        on_disk = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        _check_free_space(part_path, size - on_disk)
+        with open(part_path, "wb") as f:
+            if gl.download_preallocate:
+                _preallocate(f, size)
+            else:
+                f.truncate(size)
+        _save_part_meta(meta_path, meta)
+
+    # Per-segment progress: bytes fetched so far, by segment index
+    progress = {i: (end - start + 1 if i in done else int(partial.get(str(i), 0)))
+                for i, start, end in segments}
+    item["segments"] = progress  # read by arcenciel_download_status
+    item["segment_size"] = seg_size
+    item["total"] = size
+    item["bytes_done"] = sum(progress.values())
+    todo = [seg for seg in segments if seg[0] not in done]
+    validator = probe["etag"] or probe["last_modified"]
+    meta_lock = Lock()
+    pbar_lock = Lock()
+    canceled = False
+
+    with tqdm.tqdm(
+        total=size,
+        initial=sum(progress.values()),
+        unit='B',
+        unit_scale=True,
+        desc=f"{os.path.basename(filename)} x{gl.download_connections}",
+        ascii=True,
+        position=1,
+        dynamic_ncols=True,
+        mininterval=gl.download_progress_interval
+    ) as pbar, ThreadPoolExecutor(max_workers=gl.download_connections,
+                                  thread_name_prefix="arcen_segment") as pool:
+        futures = {
+            pool.submit(_fetch_segment, probe["url"], part_path, i, start, end,
+                        validator, progress, item, pbar, pbar_lock): i
+            for i, start, end in todo
+        }
+        try:
+            for fut in as_completed(futures):
+                if not fut.result():
+                    canceled = True
+                    continue
+                with meta_lock:
+                    meta["done_segments"].append(futures[fut])
+                    _save_part_meta(meta_path, meta)
+        except Exception:
+            for fut in futures:
+                fut.cancel()
+            raise
+        finally:
+            # Every segment file is closed once the pool is done; note where
+            # unfinished segments stopped so a pause or retry keeps those bytes
+            pool.shutdown(wait=True)
+            finished = set(meta["done_segments"])
+            meta["partial_segments"] = {str(i): n for i, n in progress.items()
+                                        if n and i not in finished}
+            _save_part_meta(meta_path, meta)
+
+    return "canceled" if canceled else "completed"
+
+def _transfer(url, filename, part_path, meta_path, item):
+    """
+    One attempt at fetching 'url' into 'part_path'. Large files on servers that
+    honor Range go through the segmented path when gl.download_connections > 1;
+    everything else, including resuming a single-stream .part, streams once.
+    """
+    meta = _load_part_meta(meta_path)
+    resuming_single = meta and not meta.get("segmented") and _resume_offset(url, part_path, meta)
+    if gl.download_connections > 1 and not resuming_single:
+        try:
+            probe = _probe_ranges(url)
+        except Exception as e:
+            gl.debug_print(f"Range probe failed for {filename}, using a single stream: {e}")
+            probe = None
+        if probe and probe["size"] >= gl.download_segmented_min_size:
+            return _transfer_segmented(url, filename, part_path, meta_path, probe, item)
+    return _transfer_single(url, filename, part_path, meta_path, item)
+
+def _finish(item, part_path, meta_path):
+    """
+    Verify a complete .part against the expected sha256 and move it into place,
+    or aside to '<filename>.quarantined' on a mismatch. The digest comes from
+    the single-stream transfer; segmented (or already complete) files are
+    hashed here, while still hot in the page cache. Verified files go into the
+    hash cache, so identifying them later never rereads them.
+    Returns "completed" or "quarantined".
+    """
+    filename = item["filename"]
+    sha_val = item.get("sha256") or hash_file(part_path)
+    item["sha256"] = sha_val
+    expected = item.get("expected_sha256")
+
+    if expected and sha_val.lower() not in expected:
+        quarantine_path = filename + ".quarantined"
+        os.replace(part_path, quarantine_path)
+        status = "quarantined"
+        gl.debug_print(f"sha256 mismatch for {filename}: got {sha_val}, expected {expected[0]}. "
+                       f"Moved to {quarantine_path}")
+    else:
+        os.replace(part_path, filename)
+        hash_cache.store(filename, sha_val, item.get("model_type"))
+        hash_cache.save()
+        library.record_download(filename, sha_val, item["model_id"], item["version_id"], item.get("model_type"))
+        status = "completed"
+    try:
+        os.remove(meta_path)
+    except OSError:
+        pass
+    return status
+
 def do_download(item):
     """
     Download one file with a file-level tqdm bar that shows bytes progress.
+    Bytes are staged in '<filename>.part' next to a '.part.json' record
+    (URL, ETag/Last-Modified, expected length), so errors, cancels and WebUI
+    restarts resume with a Range request. The file is renamed into place only
+    once complete and its sha256 checks out.
+    Returns "completed", "canceled", "paused", "failed" or "quarantined".
     """
     url = item["file_url"]
     filename = item["filename"]
+    part_path, meta_path = _part_paths(filename)
     #gl.debug_print(f"Downloading from {url} -> {filename}")
 
-    try:
-        r = requests.get(url, stream=True, timeout=60)
-        r.raise_for_status()
+    # ensure output folder
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
 
-        total_size = int(r.headers.get('content-length', 0))
-        chunk_size = 4096
-
-        # ensure output folder
-        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
-
-        # file-level bar
-        with open(filename, "wb") as f, tqdm.tqdm(
-            total=total_size,
-            unit='B',
-            unit_scale=True,
-            desc=os.path.basename(filename),
-            ascii=True,
-            position=1,
-            dynamic_ncols=True
-        ) as pbar:
-            for chunk in r.iter_content(chunk_size=chunk_size):
-                if gl.cancel_status:
-                    #gl.debug_print("Download canceled mid-file.")
-                    return
-                f.write(chunk)
-                pbar.update(len(chunk))
-
-        #gl.debug_print(f"Download completed: {filename}")
-    except Exception as e:
-        gl.debug_print(f"Failed to download {filename}: {e}")
+    attempts = 1 + max(0, gl.download_retries)
+    for attempt in range(attempts):
+        try:
+            status = _transfer(url, filename, part_path, meta_path, item)
+            if status == "completed":
+                status = _finish(item, part_path, meta_path)
+                #gl.debug_print(f"Download completed: {filename}")
+            elif status == "canceled":
+                status = _stopped_status(item)
+            return status
+        except Exception as e:
+            if attempt + 1 >= attempts or getattr(e, "errno", None) == errno.ENOSPC:
+                # A full drive won't fix itself between retries
+                gl.debug_print(f"Failed to download {filename}: {e}")
+                item["error"] = str(e)
+                return "failed"
+            delay = min(gl.download_retry_max_delay, 2 ** attempt)
+            gl.debug_print(f"Download of {filename} interrupted ({e}), resuming in {delay}s")
+            if item["stop"].wait(delay):
+                return _stopped_status(item)
+    return "failed"
+
+def _stopped_status(item):
+    """What a transfer interrupted through item["stop"] ends as."""
+    return "paused" if item["stop_reason"] in ("pause", "resume") else "canceled"
 
 def cancel_all_downloads():
     """
-    Set cancel_status, empty the queue, so we stop everything.
+    Empty the queue and stop every active or paused download.
     """
     #gl.debug_print("Canceling all downloads.")
-    gl.cancel_status = True
-    gl.download_queue.clear()
-
+    with _cond:
+        for item in gl.download_queue.clear():
+            _resolve(item, "canceled")
+        for handle in gl.futures_map.values():
+            if handle.status == "paused":
+                _resolve(handle.item, "canceled")
+            elif handle.status == "active":
+                _request_stop(handle.item, "cancel")
+        _cond.notify_all()
@@ -0,0 +1,138 @@
+# scripts/arcenciel_download_status.py
+import os
+import json
+import time
+import asyncio
+import threading
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_download as dl
+
+# What /arcenciel/downloads and /arcenciel/downloads/stream report.
+# One snapshot is rebuilt at most every gl.download_status_interval seconds and
+# shared by every poll and every open stream, so extra tabs cost nothing but
+# the JSON they receive.
+
+_lock = threading.Lock()
+_snapshot = None        # {"queued", "active", "items"}
+_snapshot_json = ""
+_snapshot_time = 0.0
+_rates = {}             # key -> (sample time, bytes_done, smoothed bytes/s)
+
+
+def _item_status(item, now):
+    """Needs _lock (for _rates)."""
+    key = item["key"]
+    state = item["status"]
+    done = item.get("bytes_done") or 0
+    total = item.get("total")
+    started = item.get("started")
+    finished = item.get("finished")
+
+    rate = 0.0
+    if state == "active":
+        last = _rates.get(key)
+        if last is None:
+            # First sample: nothing to compare with yet
+            _rates[key] = (now, done, 0.0)
+        elif now > last[0]:
+            sample = max(0.0, (done - last[1]) / (now - last[0]))
+            alpha = gl.download_rate_smoothing
+            rate = sample if not last[2] else alpha * sample + (1 - alpha) * last[2]
+            _rates[key] = (now, done, rate)
+        else:
+            rate = last[2]
+    else:
+        _rates.pop(key, None)
+
+    average = 0.0
+    if started is not None:
+        elapsed = (finished or now) - started
+        if elapsed > 0:
+            average = (item.get("transferred") or 0) / elapsed
+
+    eta = None
+    if state == "active" and total and (rate or average):
+        eta = max(0, total - done) / (rate or average)
+
+    return {
+        "key": key,
+        "model_id": item["model_id"],
+        "version_id": item["version_id"],
+        "file_name": os.path.basename(item["filename"]),
+        "model_type": item.get("model_type"),
+        "priority": item.get("priority"),
+        "rate_limit": item.get("rate_limit"),
+        "state": state,
+        "bytes_done": done,
+        "total": total,
+        "rate": round(rate),
+        "average_rate": round(average),
+        "eta": round(eta, 1) if eta is not None else None,
+        "segments": _segments_status(item),
+        "error": item.get("error"),
+    }
+
+
+def _segments_status(item):
+    """Per-segment [bytes_done, size] of a segmented transfer, in file order; None otherwise."""
+    progress = item.get("segments")
+    total = item.get("total")
+    if not progress or not total:
+        return None
+    seg_size = item.get("segment_size") or total
+    # Segment threads update the values as they go; the keys never change
+    return [[progress[i], min(seg_size, total - i * seg_size)] for i in sorted(progress)]
+
+
+def _rebuild(now):
+    """Needs _lock."""
+    global _snapshot, _snapshot_json, _snapshot_time
+    items = [_item_status(item, now) for item in dl.list_downloads()]
+    live = {entry["key"] for entry in items}
+    for key in [k for k in _rates if k not in live]:
+        del _rates[key]
+    _snapshot = {
+        "queued": sum(1 for entry in items if entry["state"] == "queued"),
+        "active": sum(1 for entry in items if entry["state"] == "active"),
+        "paused": sum(1 for entry in items if entry["state"] == "paused"),
+        "items": items,
+    }
+    _snapshot_json = json.dumps(_snapshot)
+    _snapshot_time = now
+
+
+def snapshot():
+    """Current download list; rebuilt only if the shared one is older than the interval."""
+    now = time.monotonic()
+    with _lock:
+        if _snapshot is None or now - _snapshot_time >= gl.download_status_interval:
+            _rebuild(now)
+        return _snapshot
+
+
+def snapshot_json():
+    snapshot()
+    with _lock:
+        return _snapshot_json
+
+
+async def stream(request):
+    """
+    Server-sent events for one client: the snapshot whenever it changes,
+    checked every gl.download_status_interval, plus a comment now and then
+    so proxies keep the connection open.
+    """
+    last_sent = None
+    last_write = time.monotonic()
+    while not await request.is_disconnected():
+        data = snapshot_json()
+        now = time.monotonic()
+        if data != last_sent:
+            yield f"data: {data}\n\n"
+            last_sent = data
+            last_write = now
+        elif now - last_write >= gl.download_stream_keepalive:
+            yield ": keep-alive\n\n"
+            last_write = now
+        await asyncio.sleep(gl.download_status_interval)
@@ -1,5 +1,6 @@
 # scripts/arcenciel_global.py
 from concurrent.futures import ThreadPoolExecutor
+from scripts.arcenciel_queue import DownloadQueue
 
 do_debug_print = True
 
@@ -12,12 +13,119 @@ json_data = None
 url_list = {}
 previous_inputs = None
 cancel_status = False
-download_queue = []
+download_queue = DownloadQueue()  # guarded by the scheduler in arcenciel_download.py
 isDownloading = False
 
+# Library hashing (see arcenciel_hashing.py)
+hash_sequential = None  # None = auto-detect disk type, True = one file at a time (HDD), False = parallel
+hash_workers = 0        # 0 = derive from core count
+hash_max_workers = 8    # upper bound for the derived worker count
+
+# Bulk identification pipeline (Utilities => Create JSON for Models)
+lookup_max_in_flight = 4      # concurrent ArcEnCiel search requests
+sidecar_writer_workers = 2    # concurrent JSON/preview writers
+
+# ArcEnCiel API rate limiting (HTTP 429)
+api_rate_limit_retries = 3         # retries after a 429 before giving up
+api_rate_limit_default_wait = 5.0  # seconds, when Retry-After is missing or unparsable
+api_rate_limit_max_wait = 120.0    # never sleep longer than this on one Retry-After
+
+# Shared HTTP session (see arcenciel_http.py)
+http_pool_connections = 4   # number of hosts to keep pools for
+http_pool_maxsize = 20      # keep-alive connections per host (covers a full page of thumbnails)
+http_retries = 3            # connect/read/5xx retries
+http_backoff_factor = 0.5   # sleeps 0.5s, 1s, 2s... between retries
+
+# API response cache (see arcenciel_cache.py)
+response_cache_ttls = {       # seconds a response is served without asking the server
+    "search": 120,
+    "versions": 300,
+    "model": 300,
+    "gallery": 300,
+    "image": 3600,
+}
+response_cache_max_entries = 512
+response_cache_max_bytes = 32 * 1024 * 1024
+response_cache_disk = True                         # keep an on-disk copy that survives restarts
+response_cache_disk_max_age = 7 * 24 * 3600        # drop on-disk entries unused for this long
+
+# Thumbnail store (see arcenciel_thumbs.py)
+thumb_cache_max_bytes = 512 * 1024 * 1024  # least recently used thumbnails are evicted past this
+thumb_browser_max_age = 7 * 24 * 3600      # Cache-Control max-age for /arcenciel/thumb/...
+
+# Search card updates (see arcenciel_card_updates.py)
+card_update_poll_timeout = 15.0  # seconds a long-poll waits for the next preview
+card_update_coalesce = 0.1       # seconds to gather a burst of finished previews into one response
+
+# Search page prefetch (see arcenciel_prefetch.py)
+prefetch_enabled = True
+prefetch_previous_page = False  # also prefetch page-1, not only page+1
+prefetch_max_thumbnails = 24    # thumbnails fetched ahead per prefetched page
+
+# Offline catalog mirror (see arcenciel_catalog.py)
+catalog_max_age = 24 * 3600      # seconds; an older mirror is skipped in favour of the live API
+catalog_sync_page_size = 20      # models per /models/search page while syncing (the API's maximum)
+catalog_sync_quiet_pages = 2     # an incremental sync stops after this many pages with no changes
+catalog_sync_delay = 0.2         # seconds between sync requests
+catalog_full_sync_interval = 7 * 24 * 3600  # an incremental sync runs as a full one when the last full sync is older
+catalog_page_size_max = 100      # "Models per Page" ceiling for mirror searches
+api_page_size_max = 20           # the live API's ceiling; larger page sizes are clamped to it
+
+# Downloads (see arcenciel_download.py)
+download_retries = 5             # resume attempts after a dropped connection
+download_retry_max_delay = 30    # seconds, cap for the exponential backoff between attempts
+download_chunk_min = 256 * 1024          # bytes per socket read; adapted between these two bounds
+download_chunk_max = 16 * 1024 * 1024    # so each read takes about download_chunk_target_seconds
+download_chunk_target_seconds = 0.05
+download_progress_interval = 0.5 # seconds between progress bar / .part.json bookkeeping updates
+download_preallocate = True      # reserve the full content-length on disk before writing
+download_free_space_margin = 256 * 1024 * 1024  # bytes left free on the target drive
+download_connections = 1         # >1 enables segmented downloads on servers that advertise Accept-Ranges
+download_segment_size = 32 * 1024 * 1024       # bytes per Range request in segmented mode
+download_segmented_min_size = 64 * 1024 * 1024 # smaller files always use a single stream
+
+# Bandwidth shaping (token buckets in arcenciel_download.py); bytes/s, 0 = unlimited.
+# Changed at runtime from the Browser tab's settings popup.
+download_rate_limit = 0          # all downloads together
+download_item_rate_limit = 0     # default cap for each download (overridable per download)
+interactive_reserved_rate = 0    # held back from download_rate_limit while API/thumbnail requests run
+interactive_grace = 1.0          # seconds the reserved lane stays open after the last such request
+download_min_rate = 64 * 1024    # downloads never drop below this while yielding
+
+# Subfolder suggestions (see arcenciel_subfolders.py)
+subfolder_refresh_interval = 2.0 # seconds; known folders are re-stat'ed at most this often
+
+# Local model library index (see arcenciel_library.py)
+library_refresh_interval = 60.0  # seconds between background rescans of the model library
+
+# Download scheduler
+download_max_concurrent = 3      # downloads running at once (at most the executor's 8 workers)
+download_per_host_limit = 2      # downloads running at once against the same host
+download_default_priority = 1    # lower runs first
+download_priority_by_type = {    # small models jump ahead of checkpoints
+    "LORA": 0,
+    "EMBEDDING": 0,
+    "VAE": 1,
+    "SEGMENTATION": 1,
+    "OTHER": 1,
+    "CHECKPOINT": 2,
+}
+download_history_size = 20       # finished downloads still listed by /arcenciel/downloads (and kept in the journal)
+
+# Download journal (see arcenciel_journal.py)
+journal_enabled = True           # persist the queue to downloads.db so restarts resume it
+journal_flush_interval = 0.5     # seconds; status changes within this window share one transaction
+
+# Download status routes (see arcenciel_download_status.py)
+download_status_interval = 0.5   # seconds; the shared snapshot is rebuilt at most this often
+download_rate_smoothing = 0.3    # EWMA weight of the newest sample for the instantaneous rate
+download_stream_keepalive = 15   # seconds between SSE comments while nothing changes
+
 # (Add these lines)
-executor = ThreadPoolExecutor(max_workers=4)  # up to 4 parallel downloads
-futures_map = {}  # key: model_id, value: Future object
+executor = ThreadPoolExecutor(max_workers=8)  # download workers; download_max_concurrent caps how many run
+preview_executor = ThreadPoolExecutor(max_workers=8)  # search-card thumbnails, kept apart from downloads
+prefetch_executor = ThreadPoolExecutor(max_workers=2)  # speculative neighbouring pages, below the visible one
+futures_map = {}  # key: "model_id:version_id", value: DownloadHandle (see arcenciel_download.py)
 
 def init():
     global json_data, url_list, previous_inputs
@@ -1,12 +1,18 @@
 import gradio as gr
-import time
-import requests
+import threading
+from concurrent.futures import as_completed
 from modules import shared
-import os
 
 import scripts.arcenciel_api as api
 import scripts.arcenciel_global as gl
+import scripts.arcenciel_http as http
 import scripts.arcenciel_paths as path_utils
+import scripts.arcenciel_thumbs as thumbs
+import scripts.arcenciel_prefetch as prefetch
+import scripts.arcenciel_library as library
+import scripts.arcenciel_catalog as catalog
+import scripts.arcenciel_card_updates as card_updates
+import scripts.arcenciel_subfolders as subfolders
 import scripts.arcenciel_server as server
 import scripts.arcenciel_download as dl  # For canceling downloads
 from scripts.arcenciel_paths import get_paths_for_ui
@@ -21,19 +27,14 @@ already_created_tab = False
 # Gather Subfolders
 ##########################
 
-def gather_subfolders_recursively(base_dir):
-    subfolders = []
-    for root, dirs, files in os.walk(base_dir):
-        rel_root = os.path.relpath(root, base_dir)
-        if rel_root != ".":
-            subfolders.append(rel_root.replace("\\", "/"))
-    subfolders.sort()
-    return subfolders
-
-def build_subfolder_input_html(model_type):
-    path_presets = path_utils.load_paths()
-    base_dir = path_presets.get(model_type.upper())
-    if not base_dir or not os.path.isdir(base_dir):
+def build_subfolder_input_html(model_type, with_datalist=True):
+    """
+    Subfolder input for one version block. Suggestions come from the shared,
+    incrementally refreshed index in arcenciel_subfolders. The <datalist> is
+    the same for every version of a model type, so build_model_details_html
+    emits it once and passes with_datalist=False here.
+    """
+    if subfolders.model_root(model_type) is None:
         return f"""
           <input 
             type="text" 
@@ -45,25 +46,18 @@ def build_subfolder_input_html(model_type):
           />
         """
 
-    subfolders = gather_subfolders_recursively(base_dir)
-    option_lines = ""
-    for sf in subfolders:
-        option_lines += f'<option value="{sf}"/>\n'
-
-    datalist_id = f"arcen_subfolders_{model_type.lower()}"
     html = f"""
-    <datalist id="{datalist_id}">
-      {option_lines}
-    </datalist>
     <input 
       type="text"
-      list="{datalist_id}"
+      list="{subfolders.datalist_id(model_type)}"
       class="arcen_subfolder_input"
       data-model-type="{model_type}"
       placeholder="Subfolder (optional)"
       style="margin-left:0.5em; min-width:120px;"
     />
     """
+    if with_datalist:
+        html = subfolders.datalist_html(model_type) + html
     return html
 
 ##########################
@@ -125,7 +119,11 @@ def build_image_details_html(img_data):
     """
     return html
 
-def build_model_details_html(model_data):
+def build_model_details_html(model_data, gallery_resp=None):
+    """
+    'gallery_resp' is the model's /gallery response if the caller already has it
+    (the details route fetches it alongside the model); otherwise it's fetched here.
+    """
     if not model_data or "id" not in model_data:
         return "<div>Empty or invalid model data.</div>"
 
@@ -137,7 +135,8 @@ def build_model_details_html(model_data):
     uploader = model_data.get("uploader", {})
     versions = model_data.get("versions", [])
 
-    gallery_resp = api.get_model_gallery(model_id)
+    if gallery_resp is None:
+        gallery_resp = api.get_model_gallery(model_id)
     gallery_items = gallery_resp.get("data", []) or []
     if not gallery_items:
         pinned = model_data.get("pinnedImages", [])
@@ -173,9 +172,7 @@ def build_model_details_html(model_data):
     else:
         for img_item in gallery_items:
             img_id = img_item.get("id", "")
-            file_path = (img_item.get("filePath") or "").lstrip("/")
-            file_base, _ = os.path.splitext(file_path.lstrip("/"))
-            img_url = f"https://arcenciel.io/uploads//{file_base}.thumbnail.webp" if file_path else PLACEHOLDER_IMG
+            img_url = thumbs.local_url(img_item.get("filePath")) or PLACEHOLDER_IMG
             html += f"""
             <div class='arcen_gallery_item' data-image-id="{img_id}" style="cursor:pointer;">
               <img src='{img_url}' alt='gallery item' style="max-width:100px;"/>
@@ -188,6 +185,10 @@ def build_model_details_html(model_data):
     if not versions:
         html += "<div>No versions found for this model.</div>"
     else:
+        # One <datalist> per render, shared by every version's subfolder input
+        html += subfolders.datalist_html(model_type)
+        install_state, installed_ids = library.install_status(versions)
+        latest_id = library.latest_version_id(versions)
         for ver in versions:
             v_id = ver.get("id", "")
             v_name = ver.get("versionName", "Unnamed version")
@@ -196,6 +197,8 @@ def build_model_details_html(model_data):
             activation_tags = ver.get("activationTags", [])
             file_name = ver.get("fileName", "")
             external_url = ver.get("externalDownloadUrl")
+            sha256 = ver.get("sha256") or ""
+            sha256_webui = ver.get("sha256webui") or ""
 
             if external_url:
                 direct_link = external_url
@@ -211,8 +214,15 @@ def build_model_details_html(model_data):
                 if not file_name:
                     file_name = "Unknown file"
 
+            if ver.get("id") in installed_ids:
+                version_badge = build_install_badge_html(library.INSTALLED)
+            elif install_state == library.OLDER_VERSION and ver.get("id") == latest_id:
+                version_badge = build_install_badge_html(library.OLDER_VERSION, "Update: an older version is installed")
+            else:
+                version_badge = build_install_badge_html(library.NOT_INSTALLED, "Not installed")
+
             html += "<div class='version_block' style='margin-bottom:1em; border:1px solid #444; padding:0.5em'>"
-            html += f"<b>Version ID:</b> {v_id} | <b>Name:</b> {v_name}<br/>"
+            html += f"{version_badge}<b>Version ID:</b> {v_id} | <b>Name:</b> {v_name}<br/>"
             html += f"<b>Base Model:</b> {base_model}<br/>"
 
             if activation_tags:
@@ -221,7 +231,7 @@ def build_model_details_html(model_data):
             if about:
                 html += f"<div><b>Notes:</b> {about}</div>"
 
-            subfolder_html = build_subfolder_input_html(model_type)
+            subfolder_html = build_subfolder_input_html(model_type, with_datalist=False)
 
             html += f"""
             <div style="display:flex; align-items:center; gap:0.6em; margin-top:0.5em;">
@@ -241,10 +251,18 @@ def build_model_details_html(model_data):
                 data-model-type="{model_type}"
                 data-download-url="{direct_link}"
                 data-file-name="{file_name}"
+                data-sha256="{sha256}"
+                data-sha256-webui="{sha256_webui}"
                 style="margin-top:0.2em;">
                   Download with Extension
               </button>
 
+              <span class="arcen_download_controls" data-model-id="{model_id}" data-version-id="{v_id}">
+                <button class="arcen_download_control_btn" data-action="pause" title="Pause">&#10074;&#10074;</button>
+                <button class="arcen_download_control_btn" data-action="resume" title="Resume">&#9654;</button>
+                <button class="arcen_download_control_btn" data-action="cancel" title="Cancel">&#10006;</button>
+              </span>
+
               {subfolder_html}
             </div>
             """
@@ -262,19 +280,38 @@ def build_model_details_html(model_data):
     """
     return html
 
-def build_gallery_html(data_list, total_pages=1, card_scale=30):
+# Install-state badges, from the local library index (see arcenciel_library.py)
+INSTALL_BADGES = {
+    library.INSTALLED: "Installed",
+    library.OLDER_VERSION: "Older version installed",
+    library.NOT_INSTALLED: "",
+}
+
+def build_install_badge_html(state, label=None):
+    label = INSTALL_BADGES.get(state, "") if label is None else label
+    if not label:
+        return ""
+    return f"<span class='arcen_install_badge arcen_install_{state}'>{label}</span>"
+
+def build_gallery_html(data_list, total_pages=1, card_scale=30, search_id=None):
     html = f"<div>Total pages: {total_pages}</div>"
-    html += "<div class='arcen_model_list'>"
+    if search_id:
+        # arcenciel-html.js long-polls this search's channel and patches card images in place
+        html += f"<div class='arcen_model_list' data-search-id='{search_id}'>"
+    else:
+        html += "<div class='arcen_model_list'>"
 
     for item in data_list:
         m_id = item.get("id", "N/A")
         title = item.get("title", "Untitled")
         type_ = item.get("type", "UNKNOWN")
         preview_url = item.get("preview_local") or PLACEHOLDER_IMG
+        install_state, _ = library.install_status(item.get("versions") or [])
 
         html += f"""
-          <div class='arcen_model_card' data-model-id="{m_id}">
+          <div class='arcen_model_card' data-model-id="{m_id}" data-install-state="{install_state}">
             <img class='model-bg' src="{preview_url}" alt="Preview" />
+            {build_install_badge_html(install_state)}
             <div class='model-info'>
               <b>{title}</b><br/>
               Type: {type_}<br/>
@@ -289,7 +326,8 @@ def build_gallery_html(data_list, total_pages=1, card_scale=30):
 # Search & Download Workflow
 ############################
 
-def do_search_and_download(query, sort_value, page, base_model, model_type, card_scale, model_limit):
+def do_search_and_download(query, sort_value, page, base_model, model_type, card_scale, model_limit,
+                           use_mirror=False):
     try:
         page_int = int(page)
     except:
@@ -300,51 +338,74 @@ def do_search_and_download(query, sort_value, page, base_model, model_type, card
     if model_type == "Any":
         model_type = ""
 
-    resp = api.search_models(
-        search_term=query,
-        sort=sort_value,
-        page=page_int,
-        limit=model_limit,
-        base_model=base_model,
-        model_type=model_type
-    )
+    # Keeps the install badges current; runs in the background, at most once a minute
+    library.refresh_in_background()
+
+    search_params = {
+        "search_term": query,
+        "sort": sort_value,
+        "page": page_int,
+        "limit": model_limit,
+        "base_model": base_model,
+        "model_type": model_type,
+    }
+    # A new search makes any neighbouring-page prefetch still running pointless
+    prefetch.cancel()
+    # The offline mirror answers locally, but only while it's fresh; otherwise ask the API
+    from_mirror = bool(use_mirror) and catalog.is_fresh()
+    if from_mirror:
+        resp = catalog.search(**search_params)
+    else:
+        search_params["limit"] = min(int(model_limit), gl.api_page_size_max)
+        resp = api.search_models(**search_params)
     if "data" not in resp or not resp["data"]:
         yield "<div>API error or empty data</div>"
         return
 
     data_list = resp["data"]
-    id_to_item = {}
+    prefetch.note_shown(search_params, data_list)
+    missing = []
     for item in data_list:
-        item["preview_local"] = None
-        id_to_item[item["id"]] = item
+        # Thumbnails already in the local store get their final URL right away
+        file_path = api.preview_file_path(item)
+        if file_path and thumbs.cached_path(file_path):
+            item["preview_local"] = thumbs.local_url(file_path)
+        else:
+            item["preview_local"] = None
+            if file_path:
+                missing.append(item)
 
     total_pages = resp.get("totalPages", 1)
-    yield build_gallery_html(data_list, total_pages, card_scale)
+    if not missing:
+        yield build_gallery_html(data_list, total_pages, card_scale)
+        if not from_mirror:
+            prefetch.schedule(search_params, total_pages)
+        return
 
-    # parallel preview downloads
-    unfinished = set()
-    for item in data_list:
-        m_id = item["id"]
-        fut = gl.executor.submit(api.download_preview_image, item)
-        unfinished.add((m_id, fut))
-
-    import time
-    while unfinished:
-        done_this_round = []
-        for (m_id, fut) in list(unfinished):
-            if fut.done():
-                data_url = fut.result()
-                if data_url:
-                    id_to_item[m_id]["preview_local"] = data_url
-                done_this_round.append((m_id, fut))
-
-        if done_this_round:
-            for pair in done_this_round:
-                unfinished.remove(pair)
-            yield build_gallery_html(data_list, total_pages, card_scale)
-
-        if unfinished:
-            time.sleep(0.25)
+    # The gallery is sent once; each preview that finishes afterwards goes out
+    # as a small {"id", "src"} patch on this search's update channel.
+    channel = card_updates.open_channel()
+    yield build_gallery_html(data_list, total_pages, card_scale, search_id=channel.search_id)
+
+    futures = {gl.preview_executor.submit(api.download_preview_image, item): item["id"] for item in missing}
+
+    def publish_previews():
+        try:
+            for fut in as_completed(futures):
+                try:
+                    src = fut.result()
+                except Exception as e:
+                    gl.debug_print("Error downloading preview:", e)
+                    continue
+                if src:
+                    channel.publish(futures[fut], src)
+        finally:
+            channel.close()
+        # Only once the visible page's previews are in, so it never waits on the prefetch
+        if not from_mirror:
+            prefetch.schedule(search_params, total_pages)
+
+    threading.Thread(target=publish_previews, daemon=True).start()
 
 #################################
 # Page Up / Page Down Functions
@@ -387,6 +448,17 @@ def cancel_downloads_ui():
     dl.cancel_all_downloads()
     return "All queued (and ongoing) downloads have been canceled."
 
+def set_bandwidth_limits_ui(total_mb, per_download_mb, reserved_mb):
+    """
+    Settings popup callback: MB/s from the sliders (0 = unlimited) into the
+    gl limits the download token buckets read on every chunk, so running
+    transfers speed up or slow down without restarting.
+    """
+    mb = 1024 * 1024
+    gl.download_rate_limit = int(float(total_mb or 0) * mb)
+    gl.download_item_rate_limit = int(float(per_download_mb or 0) * mb)
+    gl.interactive_reserved_rate = int(float(reserved_mb or 0) * mb)
+
 ##################################
 # Main UI callback
 ##################################
@@ -405,7 +477,7 @@ def on_ui_tabs():
     ping_url = f"{base_url}/arcenciel/ping"
 
     try:
-        r = requests.get(ping_url, timeout=2)
+        r = http.get(ping_url, kind="local")
         if r.status_code == 200:
             print("[ArcEnCiel] /arcenciel/ping => OK, routes exist.")
         else:
@@ -442,6 +514,11 @@ def on_ui_tabs():
                         choices=["Any","LORA","CHECKPOINT","VAE","EMBEDDING","SEGMENTATION","OTHER"],
                         value="Any"
                     )
+                    use_mirror_box = gr.Checkbox(
+                        label="Search offline mirror",
+                        value=False,
+                        info="Sync it in Utilities; live search is used while it's stale"
+                    )
 
                     # Cancel All Downloads button
                     cancel_btn = gr.Button(
@@ -471,13 +548,36 @@ def on_ui_tabs():
                     )
                     model_limit_slider = gr.Slider(
                         label="Models per Page",
-                        minimum=1, maximum=20, step=1, value=8
+                        minimum=1, maximum=gl.catalog_page_size_max, step=1, value=8,
+                        info=f"Above {gl.api_page_size_max} only applies to the offline mirror"
+                    )
+                    mb = 1024 * 1024
+                    total_rate_slider = gr.Slider(
+                        label="Download speed limit (MB/s, 0 = unlimited)",
+                        minimum=0, maximum=500, step=1, value=gl.download_rate_limit / mb
+                    )
+                    item_rate_slider = gr.Slider(
+                        label="Per-download speed limit (MB/s, 0 = unlimited)",
+                        minimum=0, maximum=500, step=1, value=gl.download_item_rate_limit / mb
+                    )
+                    reserved_rate_slider = gr.Slider(
+                        label="Reserved for browsing (MB/s, taken from the download limit)",
+                        minimum=0, maximum=50, step=0.5, value=gl.interactive_reserved_rate / mb
                     )
+                    for rate_slider in (total_rate_slider, item_rate_slider, reserved_rate_slider):
+                        rate_slider.change(
+                            fn=set_bandwidth_limits_ui,
+                            inputs=[total_rate_slider, item_rate_slider, reserved_rate_slider],
+                            outputs=[],
+                            queue=False
+                        )
 
                 results_html = gr.HTML("<div style='text-align:center;'>No results yet</div>",
                                        elem_id="arcenciel_results_html")
                 model_details_html = gr.HTML("<div>Select a card to see model details</div>",
                                              elem_id="arcenciel_model_details_html")
+                # Filled by arcenciel-html.js from /arcenciel/downloads/stream
+                gr.HTML("<div id='arcen_download_panel'></div>", elem_id="arcenciel_downloads_html")
 
                 # Cancel output label
                 cancel_status_label = gr.Textbox(label="Cancel Status", value="", interactive=False)
@@ -487,7 +587,8 @@ def on_ui_tabs():
                     fn=do_search_and_download,
                     inputs=[search_term, sort_box, page_box,
                             base_model_box, model_type_box,
-                            card_scale_slider, model_limit_slider],
+                            card_scale_slider, model_limit_slider,
+                            use_mirror_box],
                     outputs=[results_html],
                     queue=True
                 )
@@ -501,7 +602,8 @@ def on_ui_tabs():
                     fn=do_search_and_download,
                     inputs=[search_term, sort_box, page_box,
                             base_model_box, model_type_box,
-                            card_scale_slider, model_limit_slider],
+                            card_scale_slider, model_limit_slider,
+                            use_mirror_box],
                     outputs=[results_html],
                     queue=True
                 )
@@ -515,7 +617,8 @@ def on_ui_tabs():
                     fn=do_search_and_download,
                     inputs=[search_term, sort_box, page_box,
                             base_model_box, model_type_box,
-                            card_scale_slider, model_limit_slider],
+                            card_scale_slider, model_limit_slider,
+                            use_mirror_box],
                     outputs=[results_html],
                     queue=True
                 )
@@ -0,0 +1,220 @@
+# scripts/arcenciel_hash_cache.py
+import os
+import json
+import threading
+from pathlib import Path
+
+import scripts.arcenciel_global as gl
+
+HASH_CACHE_FILE = Path(__file__).parent.parent / "hash_cache.json"
+# ^ This places hash_cache.json in the extension root folder, next to save_paths.txt
+
+# Save to disk after this many new entries, so a crash mid-scan loses little work
+SAVE_EVERY = 25
+
+try:
+    from modules import cache as webui_cache
+except ImportError:  # older WebUI or running outside of it
+    webui_cache = None
+
+_lock = threading.RLock()
+_entries = None  # { abs_path: {"size": int, "mtime_ns": int, "sha256": str} }
+_unsaved = 0
+_stats = {"hits": 0, "webui_hits": 0, "misses": 0, "invalidated": 0}
+
+
+def _load():
+    """Read hash_cache.json once per session. Must be called with _lock held."""
+    global _entries
+    if _entries is not None:
+        return _entries
+    _entries = {}
+    if HASH_CACHE_FILE.exists():
+        try:
+            with open(HASH_CACHE_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                _entries = data
+        except Exception as e:
+            gl.debug_print(f"Could not read hash cache, starting empty: {e}")
+    return _entries
+
+
+def save():
+    """Write the cache to disk atomically (tmp file + rename)."""
+    global _unsaved
+    with _lock:
+        entries = _load()
+        tmp_path = str(HASH_CACHE_FILE) + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, HASH_CACHE_FILE)
+            _unsaved = 0
+        except Exception as e:
+            gl.debug_print(f"Could not save hash cache: {e}")
+
+
+def _webui_titles(path, model_type):
+    """
+    Titles WebUI uses for this file in its own "hashes" cache:
+      checkpoints => "checkpoint/<path relative to the model dir>"
+      loras       => "lora/<file name without extension>"
+    Checkpoints outside the model dir get no title: WebUI keys those by bare
+    file name, which a same-named file in another folder would share.
+    """
+    titles = []
+    model_type = (model_type or "").upper()
+    if model_type == "CHECKPOINT":
+        import scripts.arcenciel_paths as path_utils
+        base_dir = path_utils.load_paths().get("CHECKPOINT")
+        if base_dir:
+            abs_path, abs_base = os.path.abspath(path), os.path.abspath(base_dir)
+            try:
+                inside = os.path.commonpath([abs_path, abs_base]) == abs_base
+            except ValueError:  # different drives on Windows
+                inside = False
+            if inside:
+                titles.append("checkpoint/" + os.path.relpath(abs_path, abs_base))
+    elif model_type == "LORA":
+        titles.append("lora/" + os.path.splitext(os.path.basename(path))[0])
+    return titles
+
+
+def _webui_lookup(path, model_type, mtime):
+    if webui_cache is None:
+        return None
+    try:
+        hashes = webui_cache.cache("hashes")
+    except Exception:
+        return None
+    for title in _webui_titles(path, model_type):
+        entry = hashes.get(title)
+        if not entry or not entry.get("sha256"):
+            continue
+        # Same staleness rule WebUI applies in modules.hashes.sha256_from_cache
+        if mtime > entry.get("mtime", 0):
+            continue
+        return entry["sha256"]
+    return None
+
+
+def _webui_store(path, model_type, sha_val, mtime):
+    if webui_cache is None:
+        return
+    titles = _webui_titles(path, model_type)
+    if not titles:
+        return
+    try:
+        hashes = webui_cache.cache("hashes")
+        hashes[titles[0]] = {"mtime": mtime, "sha256": sha_val}
+        webui_cache.dump_cache()
+    except Exception as e:
+        gl.debug_print(f"Could not update WebUI hash cache: {e}")
+
+
+def lookup(path, model_type=None):
+    """
+    Return the cached sha256 for 'path' if the file is unchanged since it was
+    hashed (same size and mtime_ns), checking WebUI's own cache as a fallback.
+    Returns None on a miss; never reads file contents.
+    """
+    abs_path = os.path.abspath(path)
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        return None
+
+    with _lock:
+        entries = _load()
+        entry = entries.get(abs_path)
+        if entry:
+            if entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+                _stats["hits"] += 1
+                return entry["sha256"]
+            # File was replaced or modified since we hashed it
+            del entries[abs_path]
+            _stats["invalidated"] += 1
+
+    sha_val = _webui_lookup(abs_path, model_type, st.st_mtime)
+    if sha_val:
+        with _lock:
+            _stats["webui_hits"] += 1
+        _remember(abs_path, st, sha_val)
+        return sha_val
+
+    with _lock:
+        _stats["misses"] += 1
+    return None
+
+
+def peek(path, size, mtime_ns):
+    """
+    Cached sha256 for 'path' if it was hashed at this size and mtime_ns, else None.
+    For callers that already stat'ed the file: no I/O, no stats, no WebUI fallback.
+    """
+    with _lock:
+        entry = _load().get(os.path.abspath(path))
+    if entry and entry.get("size") == size and entry.get("mtime_ns") == mtime_ns:
+        return entry.get("sha256")
+    return None
+
+
+def _remember(abs_path, st, sha_val):
+    global _unsaved
+    with _lock:
+        _load()[abs_path] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": sha_val,
+        }
+        _unsaved += 1
+        flush = _unsaved >= SAVE_EVERY
+    if flush:
+        save()
+
+
+def store(path, sha_val, model_type=None):
+    """Record a freshly computed sha256 here and in WebUI's hash cache."""
+    abs_path = os.path.abspath(path)
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        return
+    _remember(abs_path, st, sha_val)
+    _webui_store(abs_path, model_type, sha_val, st.st_mtime)
+
+
+def get_sha256(path, model_type=None, hash_func=None):
+    """
+    Cached sha256 of 'path'. On a miss, hashes it with 'hash_func'
+    (defaults to WebUI's calculate_sha256) and stores the result.
+    """
+    sha_val = lookup(path, model_type)
+    if sha_val:
+        return sha_val
+    if hash_func is None:
+        from modules.hashes import calculate_sha256 as hash_func
+    sha_val = hash_func(path)
+    if sha_val:
+        store(path, sha_val, model_type)
+    return sha_val
+
+
+def prune():
+    """Drop entries whose files no longer exist. Returns how many were removed."""
+    with _lock:
+        entries = _load()
+        missing = [p for p in entries if not os.path.exists(p)]
+        for p in missing:
+            del entries[p]
+    if missing:
+        save()
+    return len(missing)
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_load())
+    return stats
@@ -0,0 +1,123 @@
+# scripts/arcenciel_hashing.py
+import os
+import mmap
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import scripts.arcenciel_global as gl
+
+# Slice size fed to hashlib when falling back to mmap. hashlib releases the GIL
+# for large updates, so worker threads really do hash in parallel.
+MMAP_SLICE = 8 * 1024 * 1024
+
+
+def hash_file(file_path):
+    """
+    sha256 hex digest of one file.
+    Uses hashlib.file_digest (zero-copy readinto, Python 3.11+) when available,
+    otherwise a read-only mmap sliced through a memoryview.
+    """
+    with open(file_path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+        sha = hashlib.sha256()
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return sha.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, size, MMAP_SLICE):
+                    sha.update(view[offset:offset + MMAP_SLICE])
+            finally:
+                view.release()
+        return sha.hexdigest()
+
+
+def _is_rotational(path):
+    """
+    Best-effort spinning-disk detection (Linux sysfs only).
+    Returns True/False, or None when it can't tell.
+    """
+    try:
+        dev = os.stat(path).st_dev
+        sys_dir = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+        for candidate in (f"{sys_dir}/queue/rotational", f"{sys_dir}/../queue/rotational"):
+            if os.path.exists(candidate):
+                with open(candidate, "r") as f:
+                    return f.read().strip() == "1"
+    except (OSError, AttributeError, ValueError):
+        pass
+    return None
+
+
+def pick_worker_count(paths, sequential=None):
+    """
+    How many files to hash at once.
+      sequential=True  => 1 (spinning disks: parallel reads just add seeks)
+      sequential=False => gl.hash_workers, or cores capped at gl.hash_max_workers
+      sequential=None  => "auto", sequential only if the first file is on a rotational disk
+    """
+    if sequential is None:
+        sequential = gl.hash_sequential
+    if sequential is None and paths:
+        sequential = bool(_is_rotational(paths[0]))
+    if sequential:
+        return 1
+    if gl.hash_workers:
+        return max(1, int(gl.hash_workers))
+    return max(1, min(os.cpu_count() or 1, gl.hash_max_workers))
+
+
+def hash_files(paths, sequential=None, cancel_event=None):
+    """
+    Generator that hashes 'paths' on a bounded worker pool.
+    Work is ordered largest-file-first so one huge checkpoint doesn't end up
+    alone at the tail. At most 'workers' files are in flight at a time,
+    which keeps memory flat no matter how large the library is.
+
+    Yields (path, sha256, error) as each file completes, in completion order.
+    """
+    def _size(p):
+        try:
+            return os.path.getsize(p)
+        except OSError:
+            return 0
+
+    ordered = sorted(paths, key=_size, reverse=True)
+    workers = pick_worker_count(ordered, sequential)
+    #gl.debug_print(f"Hashing {len(ordered)} files with {workers} worker(s)")
+
+    if workers == 1:
+        for p in ordered:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            try:
+                yield p, hash_file(p), None
+            except Exception as e:
+                yield p, None, e
+        return
+
+    remaining = iter(ordered)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="arcen_hash") as pool:
+        def _fill():
+            while len(in_flight) < workers:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                p = next(remaining, None)
+                if p is None:
+                    return
+                in_flight[pool.submit(hash_file, p)] = p
+
+        _fill()
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for fut in done:
+                p = in_flight.pop(fut)
+                try:
+                    yield p, fut.result(), None
+                except Exception as e:
+                    yield p, None, e
+            _fill()
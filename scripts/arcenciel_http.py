@@ -0,0 +1,186 @@
+# scripts/arcenciel_http.py
+import time
+import threading
+import contextlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import scripts.arcenciel_global as gl
+
+USER_AGENT = "ArcEnCiel-Extension-for-WebUI"
+
+# (connect, read) timeouts in seconds, per kind of traffic
+TIMEOUTS = {
+    "api": (5, 20),        # JSON calls to arcenciel.io/api
+    "thumbnail": (5, 20),  # preview images from arcenciel.io/uploads
+    "download": (10, 60),  # model files; read timeout is per chunk, not total
+    "prefetch": (5, 20),   # speculative next-page searches and thumbnails, see arcenciel_prefetch.py
+    "local": (2, 2),       # our own WebUI routes
+}
+
+# Traffic someone is waiting on in the UI; downloads yield bandwidth to it
+# (see TokenBucket in arcenciel_download.py)
+INTERACTIVE_KINDS = ("api", "thumbnail")
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_request_counts = {}  # kind -> number of requests sent
+_interactive_in_flight = 0
+_interactive_last = 0.0  # time.monotonic() when the last interactive request finished
+_connect_counts = {}  # "scheme://host:port" -> TCP(+TLS) handshakes actually performed
+
+
+def _count_connect(scheme, host, port):
+    key = f"{scheme}://{host}:{port}"
+    with _stats_lock:
+        _connect_counts[key] = _connect_counts.get(key, 0) + 1
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _count_connect("http", self.host, self.port)
+        return super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _count_connect("https", self.host, self.port)
+        return super().connect()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+def _build_retry():
+    """
+    Retry transient failures with exponential backoff.
+    429 is left to the caller (see arcenciel_api.request_arc_api), which shares
+    the Retry-After delay between threads and caps it; urllib3 would otherwise
+    retry any 429 carrying Retry-After itself and sleep for as long as it says.
+    """
+    return Retry(
+        total=gl.http_retries,
+        connect=gl.http_retries,
+        read=gl.http_retries,
+        status=gl.http_retries,
+        backoff_factor=gl.http_backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+
+
+def get_session():
+    """
+    The extension-wide requests.Session.
+    One keep-alive connection pool per host is shared by every thread; urllib3's
+    pools are thread-safe, so callers never need their own session.
+    """
+    global _session
+    if _session is not None:
+        return _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(
+                pool_connections=gl.http_pool_connections,
+                pool_maxsize=gl.http_pool_maxsize,
+                max_retries=_build_retry(),
+            )
+            # Count real handshakes: urllib3 reuses connection objects across reconnects
+            adapter.poolmanager.pool_classes_by_scheme = {
+                "http": _CountingHTTPConnectionPool,
+                "https": _CountingHTTPSConnectionPool,
+            }
+            s = requests.Session()
+            s.headers.update({"User-Agent": USER_AGENT})
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+    return _session
+
+
+def get(url, kind="api", **kwargs):
+    """
+    GET through the shared session. 'kind' selects the default timeout;
+    pass timeout=... explicitly to override it.
+    """
+    kwargs.setdefault("timeout", TIMEOUTS.get(kind, TIMEOUTS["api"]))
+    with tracked(kind):
+        return get_session().get(url, **kwargs)
+
+
+@contextlib.contextmanager
+def tracked(kind):
+    """
+    Count one request of 'kind' and, for interactive kinds, hold the reserved
+    bandwidth lane open while it runs. Also used by arcenciel_api_async,
+    whose requests don't go through this session.
+    """
+    global _interactive_in_flight, _interactive_last
+    interactive = kind in INTERACTIVE_KINDS
+    with _stats_lock:
+        _request_counts[kind] = _request_counts.get(kind, 0) + 1
+        if interactive:
+            _interactive_in_flight += 1
+    try:
+        yield
+    finally:
+        if interactive:
+            with _stats_lock:
+                _interactive_in_flight -= 1
+                _interactive_last = time.monotonic()
+
+
+def interactive_active():
+    """True while API/thumbnail requests are in flight or finished within gl.interactive_grace seconds."""
+    with _stats_lock:
+        if _interactive_in_flight:
+            return True
+        return time.monotonic() - _interactive_last < gl.interactive_grace
+
+
+def head(url, kind="api", **kwargs):
+    kwargs.setdefault("timeout", TIMEOUTS.get(kind, TIMEOUTS["api"]))
+    with _stats_lock:
+        _request_counts[kind] = _request_counts.get(kind, 0) + 1
+    return get_session().head(url, **kwargs)
+
+
+def get_stats():
+    """
+    Connection reuse counters, per host:
+      requests     => requests sent to that host
+      connections  => new TCP(+TLS) handshakes it took
+      reused       => requests that rode an existing keep-alive connection
+    """
+    stats = {"requests_by_kind": {}, "hosts": {}}
+    with _stats_lock:
+        stats["requests_by_kind"] = dict(_request_counts)
+        connects = dict(_connect_counts)
+
+    session = _session
+    if session is None:
+        return stats
+    pools = session.get_adapter("https://").poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        host = f"{pool.scheme}://{pool.host}:{pool.port}"
+        n_connects = connects.get(host, 0)
+        stats["hosts"][host] = {
+            "requests": pool.num_requests,
+            "connections": n_connects,
+            "reused": max(0, pool.num_requests - n_connects),
+        }
+    return stats
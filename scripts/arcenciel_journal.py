@@ -0,0 +1,193 @@
+# scripts/arcenciel_journal.py
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from pathlib import Path
+
+import scripts.arcenciel_global as gl
+
+JOURNAL_DB = Path(__file__).parent.parent / "downloads.db"
+# ^ This places downloads.db in the extension root folder, next to save_paths.txt
+
+# Durable record of every download, so a WebUI restart doesn't drop the queue.
+# The scheduler calls record() on each status change (never per chunk); a
+# single writer thread batches those into one transaction every
+# gl.journal_flush_interval seconds. Byte progress lives in the .part.json
+# records, so the journal only has to know what to fetch and where it stood.
+
+UNFINISHED_STATES = ("queued", "active", "paused")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    key TEXT PRIMARY KEY,
+    model_id TEXT,
+    version_id TEXT,
+    file_url TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    model_type TEXT,
+    priority INTEGER,
+    expected_sha256 TEXT,
+    status TEXT NOT NULL,
+    bytes_done INTEGER,
+    total INTEGER,
+    error TEXT,
+    updated REAL NOT NULL
+)
+"""
+
+_COLUMNS = ("key", "model_id", "version_id", "file_url", "filename", "model_type", "priority",
+            "expected_sha256", "status", "bytes_done", "total", "error", "updated")
+
+_STOP = object()
+_pending = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _connect():
+    conn = sqlite3.connect(str(JOURNAL_DB), timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL survives a crashed process; only an OS crash may lose the last batch
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def record(item):
+    """Queue the item's current state for the writer thread. Cheap; never blocks on disk."""
+    if not gl.journal_enabled:
+        return
+    _pending.put({
+        "key": item["key"],
+        "model_id": str(item["model_id"]),
+        "version_id": str(item["version_id"]),
+        "file_url": item["file_url"],
+        "filename": item["filename"],
+        "model_type": item.get("model_type"),
+        "priority": item.get("priority"),
+        "expected_sha256": json.dumps(item.get("expected_sha256") or []),
+        "status": item["status"],
+        "bytes_done": item.get("bytes_done"),
+        "total": item.get("total"),
+        "error": item.get("error"),
+        "updated": time.time(),
+    })
+    _ensure_writer()
+
+
+def _ensure_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="arcen_journal", daemon=True)
+            _writer.start()
+
+
+def _write(conn, rows):
+    placeholders = ", ".join("?" for _ in _COLUMNS)
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO downloads ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+            [tuple(row[c] for c in _COLUMNS) for row in rows],
+        )
+
+
+def _writer_loop():
+    conn = _connect()
+    try:
+        while True:
+            row = _pending.get()
+            batch = {}
+            deadline = time.monotonic() + gl.journal_flush_interval
+            stop = False
+            # Collect everything that arrives within the interval; later states win
+            while True:
+                if row is _STOP:
+                    stop = True
+                    break
+                batch[row["key"]] = row
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = _pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    _write(conn, batch.values())
+                except sqlite3.Error as e:
+                    gl.debug_print(f"Could not write download journal: {e}")
+            if stop:
+                return
+    finally:
+        conn.close()
+
+
+def flush(timeout=5):
+    """Write out whatever is pending and stop the writer (restarted by the next record())."""
+    global _writer
+    with _writer_lock:
+        writer = _writer
+        _writer = None
+    if writer is not None and writer.is_alive():
+        _pending.put(_STOP)
+        writer.join(timeout)
+
+
+atexit.register(flush)
+
+
+def load_unfinished():
+    """Rows (dicts) of downloads that were queued, active or paused, oldest first."""
+    if not gl.journal_enabled or not JOURNAL_DB.exists():
+        return []
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        gl.debug_print(f"Could not open download journal: {e}")
+        return []
+    try:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            f"SELECT * FROM downloads WHERE status IN ({', '.join('?' for _ in UNFINISHED_STATES)}) "
+            "ORDER BY updated",
+            UNFINISHED_STATES,
+        ).fetchall()
+        result = []
+        for row in rows:
+            entry = dict(row)
+            try:
+                entry["expected_sha256"] = json.loads(entry["expected_sha256"] or "[]")
+            except ValueError:
+                entry["expected_sha256"] = []
+            result.append(entry)
+        return result
+    finally:
+        conn.close()
+
+
+def prune(keep=None):
+    """Delete all but the 'keep' most recent finished rows (default gl.download_history_size)."""
+    if not gl.journal_enabled or not JOURNAL_DB.exists():
+        return
+    keep = gl.download_history_size if keep is None else keep
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        gl.debug_print(f"Could not open download journal: {e}")
+        return
+    try:
+        with conn:
+            conn.execute(
+                f"DELETE FROM downloads WHERE status NOT IN ({', '.join('?' for _ in UNFINISHED_STATES)}) "
+                "AND key NOT IN (SELECT key FROM downloads "
+                f"WHERE status NOT IN ({', '.join('?' for _ in UNFINISHED_STATES)}) "
+                "ORDER BY updated DESC LIMIT ?)",
+                UNFINISHED_STATES + UNFINISHED_STATES + (keep,),
+            )
+    finally:
+        conn.close()
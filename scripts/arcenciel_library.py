@@ -0,0 +1,517 @@
+# scripts/arcenciel_library.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_hash_cache as hash_cache
+import scripts.arcenciel_paths as path_utils
+
+LIBRARY_DB = Path(__file__).parent.parent / "library_index.db"
+# ^ This places library_index.db in the extension root folder, next to save_paths.txt
+
+# File extensions treated as model files
+MODEL_EXTS = (".safetensors", ".ckpt", ".bin", ".pt")
+
+# Persistent index of the local model library: every model file under the
+# configured folders with its size, mtime, sha256 (once known) and the
+# ArcEnCiel model/version it matched. Kept in memory, mirrored to SQLite.
+#
+# scan() only rereads directories whose mtime moved since the last scan (a
+# directory's mtime changes when an entry directly inside it is added,
+# removed or renamed); unchanged ones are a single stat. Lookups by sha256,
+# model or version are dict lookups and never touch the disk.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    model_type TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    model_id TEXT,
+    version_id TEXT
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+_FILE_COLUMNS = ("path", "model_type", "size", "mtime_ns", "sha256", "model_id", "version_id")
+
+_lock = threading.RLock()
+_scan_lock = threading.Lock()  # one scan at a time; lookups only need _lock
+_loaded = False
+_files = {}       # abs path -> {"model_type", "size", "mtime_ns", "sha256", "model_id", "version_id"}
+_dirs = {}        # abs dir -> {"mtime_ns", "files": set of names, "subdirs": set of names}
+_by_sha = {}      # sha256 (lower) -> set of paths
+_by_model = {}    # model_id -> set of paths
+_by_version = {}  # version_id -> set of paths
+_dirty_files = set()
+_dirty_dirs = set()
+_refresh_thread = None
+_refreshed = 0.0   # time.monotonic() of the last background refresh
+_stats = {"scans": 0, "dirs_checked": 0, "dirs_rescanned": 0}
+
+# Install states for a model (see install_status)
+INSTALLED = "installed"
+OLDER_VERSION = "older_version"
+NOT_INSTALLED = "not_installed"
+
+
+def _connect():
+    conn = sqlite3.connect(str(LIBRARY_DB), timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _index(path, entry):
+    """Add 'path' to the lookup dicts. Needs _lock."""
+    if entry.get("sha256"):
+        _by_sha.setdefault(entry["sha256"].lower(), set()).add(path)
+    if entry.get("model_id"):
+        _by_model.setdefault(entry["model_id"], set()).add(path)
+    if entry.get("version_id"):
+        _by_version.setdefault(entry["version_id"], set()).add(path)
+
+
+def _unindex(path, entry):
+    """Remove 'path' from the lookup dicts. Needs _lock."""
+    for table, value in (
+        (_by_sha, (entry.get("sha256") or "").lower()),
+        (_by_model, entry.get("model_id")),
+        (_by_version, entry.get("version_id")),
+    ):
+        paths = table.get(value)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del table[value]
+
+
+def _put(path, entry):
+    """Insert or replace one file entry. Needs _lock."""
+    old = _files.get(path)
+    if old is not None:
+        _unindex(path, old)
+    _files[path] = entry
+    _index(path, entry)
+    _dirty_files.add(path)
+
+
+def _remove(path):
+    """Needs _lock."""
+    old = _files.pop(path, None)
+    if old is not None:
+        _unindex(path, old)
+        _dirty_files.add(path)
+
+
+def _load():
+    """Read library_index.db once per session. Needs _lock."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    if not LIBRARY_DB.exists():
+        return
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        gl.debug_print(f"Could not open library index, starting empty: {e}")
+        return
+    try:
+        for row in conn.execute(f"SELECT {', '.join(_FILE_COLUMNS)} FROM files"):
+            path = row[0]
+            entry = dict(zip(_FILE_COLUMNS[1:], row[1:]))
+            _files[path] = entry
+            _index(path, entry)
+        for path, mtime_ns in conn.execute("SELECT path, mtime_ns FROM dirs"):
+            _dirs[path] = {"mtime_ns": mtime_ns, "files": set(), "subdirs": set()}
+    except sqlite3.Error as e:
+        gl.debug_print(f"Could not read library index, starting empty: {e}")
+        _files.clear()
+        _dirs.clear()
+        for table in (_by_sha, _by_model, _by_version):
+            table.clear()
+    finally:
+        conn.close()
+
+    # Rebuild each directory's listing from the paths themselves
+    for path in _files:
+        parent = _dirs.get(os.path.dirname(path))
+        if parent is not None:
+            parent["files"].add(os.path.basename(path))
+    for path in _dirs:
+        parent = _dirs.get(os.path.dirname(path))
+        if parent is not None and parent is not _dirs[path]:
+            parent["subdirs"].add(os.path.basename(path))
+
+
+def save():
+    """Write changed entries to library_index.db in one transaction."""
+    with _lock:
+        if not _dirty_files and not _dirty_dirs:
+            return
+        upserts = [(p, *(_files[p][c] for c in _FILE_COLUMNS[1:])) for p in _dirty_files if p in _files]
+        deletes = [(p,) for p in _dirty_files if p not in _files]
+        dir_upserts = [(p, _dirs[p]["mtime_ns"]) for p in _dirty_dirs if p in _dirs]
+        dir_deletes = [(p,) for p in _dirty_dirs if p not in _dirs]
+        _dirty_files.clear()
+        _dirty_dirs.clear()
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO files ({', '.join(_FILE_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in _FILE_COLUMNS)})",
+                    upserts,
+                )
+                conn.executemany("DELETE FROM files WHERE path = ?", deletes)
+                conn.executemany("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", dir_upserts)
+                conn.executemany("DELETE FROM dirs WHERE path = ?", dir_deletes)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        gl.debug_print(f"Could not save library index: {e}")
+
+
+def _drop_dir(path):
+    """Forget a directory, its files and everything below it. Needs _lock."""
+    info = _dirs.pop(path, None)
+    if info is None:
+        return
+    _dirty_dirs.add(path)
+    for name in info["files"]:
+        _remove(os.path.join(path, name))
+    for name in info["subdirs"]:
+        _drop_dir(os.path.join(path, name))
+
+
+def _read_sidecar(path):
+    """(model_id, version_id) from the JSON sidecar Utilities writes next to a model, if any."""
+    try:
+        with open(os.path.splitext(path)[0] + ".json", "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    if not isinstance(data, dict) or not data.get("modelId") or not data.get("modelVersionId"):
+        return None, None
+    return str(data["modelId"]), str(data["modelVersionId"])
+
+
+def _rescan_dir(path, model_type, mtime_ns):
+    """Reread one directory's entries. Needs _scan_lock, takes _lock for the update."""
+    files = {}     # name -> (size, mtime_ns)
+    subdirs = set()
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    # Like os.walk: symlinked folders aren't descended into
+                    if not entry.is_symlink():
+                        subdirs.add(entry.name)
+                elif entry.name.lower().endswith(MODEL_EXTS):
+                    st = entry.stat()
+                    files[entry.name] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+
+    with _lock:
+        old = _dirs.get(path) or {"files": set(), "subdirs": set()}
+        for name in old["subdirs"] - subdirs:
+            _drop_dir(os.path.join(path, name))
+        for name in old["files"] - set(files):
+            _remove(os.path.join(path, name))
+        for name, (size, file_mtime) in files.items():
+            file_path = os.path.join(path, name)
+            entry = _files.get(file_path)
+            if entry is not None and entry["size"] == size and entry["mtime_ns"] == file_mtime:
+                if entry["model_type"] != model_type:
+                    _put(file_path, dict(entry, model_type=model_type))
+                continue
+            model_id, version_id = _read_sidecar(file_path)
+            # New or changed content: the hash is known only if it was hashed as it is now
+            sha_val = hash_cache.peek(file_path, size, file_mtime)
+            _put(file_path, {
+                "model_type": model_type,
+                "size": size,
+                "mtime_ns": file_mtime,
+                "sha256": sha_val.lower() if sha_val else None,
+                "model_id": model_id,
+                "version_id": version_id,
+            })
+        _dirs[path] = {"mtime_ns": mtime_ns, "files": set(files), "subdirs": subdirs}
+        _dirty_dirs.add(path)
+        _stats["dirs_rescanned"] += 1
+
+
+def _configured_roots():
+    """[(abs folder, model type)] from save_paths.txt, deepest folder first."""
+    roots = {}
+    for model_type, root in path_utils.load_paths().items():
+        if root:
+            roots.setdefault(os.path.abspath(root), model_type)
+    return sorted(roots.items(), key=lambda item: len(item[0]), reverse=True)
+
+
+def _type_for(path, roots, default):
+    """
+    Model type of the most specific configured folder containing 'path', so
+    files under nested folders (a LoRA folder inside the checkpoint one, say)
+    keep one type whichever folder is scanned last.
+    """
+    for root, model_type in roots:
+        if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+            return model_type
+    return default
+
+
+def scan(root, model_type=None):
+    """
+    Bring the index up to date for everything under 'root' and return the
+    model files found there (sorted). Directories whose mtime is unchanged
+    since the last scan are not listed again. Files get the type of the most
+    specific configured folder they are in, else 'model_type'.
+    """
+    root = os.path.abspath(root)
+    roots = _configured_roots()
+    with _scan_lock:
+        with _lock:
+            _load()
+            _stats["scans"] += 1
+        found = []
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                with _lock:
+                    _drop_dir(path)
+                continue
+            with _lock:
+                _stats["dirs_checked"] += 1
+                info = _dirs.get(path)
+                unchanged = info is not None and info["mtime_ns"] == mtime_ns
+            if not unchanged:
+                try:
+                    _rescan_dir(path, _type_for(path, roots, model_type), mtime_ns)
+                except OSError:
+                    with _lock:
+                        _drop_dir(path)
+                    continue
+            with _lock:
+                info = _dirs[path]
+                found.extend(os.path.join(path, name) for name in info["files"])
+                stack.extend(os.path.join(path, name) for name in info["subdirs"])
+        save()
+    found.sort()
+    return found
+
+
+def scan_all():
+    """scan() every configured model folder."""
+    for root, model_type in _configured_roots():
+        if os.path.isdir(root):
+            scan(root, model_type)
+
+
+def refresh_in_background():
+    """
+    Start a scan_all() on a daemon thread, unless one is running or the last
+    one finished less than gl.library_refresh_interval seconds ago. Never blocks.
+    """
+    global _refresh_thread
+
+    def run():
+        global _refreshed
+        try:
+            scan_all()
+        except Exception as e:
+            gl.debug_print(f"Library scan failed: {e}")
+        finally:
+            _refreshed = time.monotonic()
+
+    with _lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return
+        if _refreshed and time.monotonic() - _refreshed < gl.library_refresh_interval:
+            return
+        _refresh_thread = threading.Thread(target=run, name="arcen_library_scan", daemon=True)
+        _refresh_thread.start()
+
+
+def _track_file(path, **fields):
+    """Update (or add, if it exists on disk) one file's entry."""
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    with _lock:
+        _load()
+        entry = _files.get(path)
+        if entry is None or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            entry = {
+                "model_type": entry["model_type"] if entry else None,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha256": None,
+                "model_id": None,
+                "version_id": None,
+            }
+        for key, value in fields.items():
+            if key == "model_type":
+                entry[key] = value or entry[key]
+            else:
+                entry[key] = str(value) if value is not None else None
+        _put(path, dict(entry))
+        parent = _dirs.get(os.path.dirname(path))
+        if parent is not None:
+            parent["files"].add(os.path.basename(path))
+
+
+def record_hash(path, sha_val, model_type=None):
+    """Remember the sha256 of a file (e.g. right after hashing it). Call save() when done."""
+    _track_file(path, sha256=sha_val.lower() if sha_val else None, model_type=model_type)
+
+
+def record_match(path, model_id, version_id):
+    """Remember which ArcEnCiel model/version a file is. Call save() when done."""
+    _track_file(path, model_id=model_id, version_id=version_id)
+
+
+def record_download(path, sha_val, model_id, version_id, model_type=None):
+    """A finished download: its hash and identity are both known already."""
+    _track_file(path, sha256=sha_val.lower() if sha_val else None,
+                model_id=model_id, version_id=version_id, model_type=model_type)
+    save()
+
+
+def record_copy(source, path, model_id, version_id, model_type=None):
+    """
+    A file just hardlinked or copied from 'source': same bytes, so it takes
+    the source's sha256 (here and in the hash cache) with the given identity.
+    """
+    entry = get(source)
+    sha_val = entry.get("sha256") if entry else None
+    if sha_val:
+        hash_cache.store(path, sha_val, model_type)
+        hash_cache.save()
+    record_download(path, sha_val, model_id, version_id, model_type)
+
+
+def find_by_sha256(sha_values):
+    """
+    Paths of indexed files with one of these sha256 digests, for download
+    dedupe. Only files still at the size and mtime they were hashed at
+    count; one stat per candidate, no file is read.
+    """
+    with _lock:
+        _load()
+        candidates = sorted({path for sha_val in sha_values if sha_val
+                             for path in _by_sha.get(sha_val.lower(), ())})
+    found = []
+    for path in candidates:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue  # gone; the next scan of its folder drops it
+        with _lock:
+            entry = _files.get(path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            found.append(path)
+    return found
+
+
+def get(path):
+    """The entry for 'path' (a copy), or None."""
+    with _lock:
+        _load()
+        entry = _files.get(os.path.abspath(path))
+        return dict(entry, path=os.path.abspath(path)) if entry else None
+
+
+def files_for_sha256(sha_val):
+    with _lock:
+        _load()
+        return sorted(_by_sha.get((sha_val or "").lower(), ()))
+
+
+def files_for_model(model_id):
+    with _lock:
+        _load()
+        return sorted(_by_model.get(str(model_id), ()))
+
+
+def files_for_version(version_id):
+    with _lock:
+        _load()
+        return sorted(_by_version.get(str(version_id), ()))
+
+
+def has_version(version_id):
+    with _lock:
+        _load()
+        return str(version_id) in _by_version
+
+
+def versions_for_model(model_id):
+    """Version ids of a model that are on disk."""
+    with _lock:
+        _load()
+        return {_files[p]["version_id"] for p in _by_model.get(str(model_id), ())}
+
+
+def _version_on_disk(version):
+    """Needs _lock."""
+    if version.get("id") is not None and str(version["id"]) in _by_version:
+        return True
+    return any(version.get(key) and version[key].lower() in _by_sha for key in ("sha256", "sha256webui"))
+
+
+def latest_version_id(versions):
+    """Id of the newest of 'versions' (ids grow with each upload)."""
+    def order(version):
+        try:
+            return int(version.get("id"))
+        except (TypeError, ValueError):
+            return -1
+    return max(versions, key=order).get("id")
+
+
+def install_status(versions):
+    """
+    What of a model's 'versions' (as in API responses: "id", "sha256",
+    "sha256webui") is on disk. Returns (state, installed version ids):
+    INSTALLED if the newest version is, OLDER_VERSION if only earlier ones
+    are, NOT_INSTALLED otherwise. Pure in-memory lookups.
+    """
+    if not versions:
+        return NOT_INSTALLED, set()
+    with _lock:
+        _load()
+        installed = {version.get("id") for version in versions if _version_on_disk(version)}
+    if not installed:
+        return NOT_INSTALLED, installed
+    if latest_version_id(versions) in installed:
+        return INSTALLED, installed
+    return OLDER_VERSION, installed
+
+
+def get_stats():
+    with _lock:
+        _load()
+        stats = dict(_stats)
+        stats["files"] = len(_files)
+        stats["dirs"] = len(_dirs)
+        stats["hashed"] = sum(len(paths) for paths in _by_sha.values())
+        stats["matched"] = sum(len(paths) for paths in _by_version.values())
+    return stats
@@ -7,13 +7,18 @@ SAVED_PATHS_FILE = Path(__file__).parent.parent / "save_paths.txt"
 # The known model types we want to handle
 KNOWN_TYPES = ["LORA", "CHECKPOINT", "VAE", "EMBEDDING", "SEGMENTATION", "OTHER"]
 
+# Parsed save_paths.txt, keyed by its (mtime_ns, size) so edits on disk are picked up
+_cache_key = None
+_cache = None
+
 def load_paths():
     """
     Load path presets from save_paths.txt (line-based key=value).
     If file doesn't exist, create it with placeholder paths.
     Return a dict { "LORA": "...", "CHECKPOINT": "...", ... }
+    The file is only re-read when it changes; callers get their own copy.
     """
-    print("[ArcEnCiel] load_paths() reading from:", SAVED_PATHS_FILE)
+    global _cache_key, _cache
     default_dict = {t: f"C:\\myModels\\{t.lower()}" for t in KNOWN_TYPES}
     # This is our fallback if the file doesn't exist or is incomplete
 
@@ -22,6 +27,10 @@ def load_paths():
         _save_paths(default_dict)
         return default_dict
 
+    st = SAVED_PATHS_FILE.stat()
+    if _cache is not None and _cache_key == (st.st_mtime_ns, st.st_size):
+        return dict(_cache)
+
     # Otherwise, parse the file line by line
     loaded_dict = dict(default_dict)  # start with defaults
     with open(SAVED_PATHS_FILE, "r", encoding="utf-8") as f:
@@ -34,12 +43,15 @@ def load_paths():
             val = val.strip()
             if key in KNOWN_TYPES:
                 loaded_dict[key] = val
+    _cache_key, _cache = (st.st_mtime_ns, st.st_size), dict(loaded_dict)
     return loaded_dict
 
 def _save_paths(paths_dict):
     """
     Internal helper that overwrites save_paths.txt with lines in key=value format.
     """
+    global _cache
+    _cache = None  # mtime granularity could hide a quick rewrite
     with open(SAVED_PATHS_FILE, "w", encoding="utf-8") as f:
         for k, v in paths_dict.items():
             f.write(f"{k}={v}\n")
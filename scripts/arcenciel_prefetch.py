@@ -0,0 +1,137 @@
+# scripts/arcenciel_prefetch.py
+import threading
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_api as api
+import scripts.arcenciel_thumbs as thumbs
+
+# Speculative prefetch for the search tab's Previous/Next Page buttons.
+# Once a page and its previews are on screen, the neighbouring page's search
+# response and thumbnails are pulled into the response cache and the
+# thumbnail store, so paging finds them there.
+#
+# Every schedule() bumps a generation counter; jobs check it before each
+# request and quietly stop once a newer search has started. Work runs on
+# gl.prefetch_executor (a couple of workers, one thumbnail at a time each),
+# never on the preview executor the visible page uses.
+
+_lock = threading.Lock()
+_generation = 0
+_query_key = None       # search params minus the page, for the current query
+_last_page = None       # page most recently shown for _query_key
+_pages = set()          # pages of _query_key prefetched (or being prefetched)
+_thumbs = set()         # filePaths the prefetcher put in the store, not shown yet
+_stats = {
+    "pages_prefetched": 0,
+    "page_hits": 0,          # a page shown after paging had been prefetched
+    "page_misses": 0,        # a page shown after paging had not
+    "thumbnails_prefetched": 0,
+    "thumbnail_hits": 0,     # a card shown with a thumbnail the prefetcher fetched
+    "thumbnails_wasted": 0,  # prefetched thumbnails dropped before ever being shown
+    "canceled": 0,           # jobs stopped early by a newer search
+}
+
+
+def _query_of(params):
+    return tuple(sorted((k, str(v)) for k, v in params.items() if k != "page"))
+
+
+def note_shown(params, data_list):
+    """
+    Record a page the user is about to see, for the hit-rate stats.
+    'params' are the api.search_models kwargs, 'data_list' the page's models.
+    """
+    query = _query_of(params)
+    page = params.get("page", 1)
+    with _lock:
+        if query == _query_key and page != _last_page:
+            if page in _pages:
+                _stats["page_hits"] += 1
+            else:
+                _stats["page_misses"] += 1
+        for item in data_list:
+            file_path = api.preview_file_path(item)
+            if file_path in _thumbs:
+                _thumbs.discard(file_path)
+                _stats["thumbnail_hits"] += 1
+
+
+def schedule(params, total_pages):
+    """
+    Start prefetching the pages next to params["page"] (and stop any older
+    prefetch). Call once the visible page and its previews are done.
+    """
+    global _generation, _query_key, _last_page
+    query = _query_of(params)
+    page = params.get("page", 1)
+    with _lock:
+        _generation += 1
+        generation = _generation
+        if query != _query_key:
+            _stats["thumbnails_wasted"] += len(_thumbs)
+            _thumbs.clear()
+            _pages.clear()
+            _query_key = query
+        _last_page = page
+        if not gl.prefetch_enabled:
+            return
+        targets = [page + 1]
+        if gl.prefetch_previous_page:
+            targets.append(page - 1)
+        targets = [p for p in targets if 1 <= p <= total_pages and p != page and p not in _pages]
+        _pages.update(targets)
+
+    for target in targets:
+        gl.prefetch_executor.submit(_prefetch_page, generation, dict(params, page=target))
+
+
+def cancel():
+    """Stop whatever is being prefetched (the next schedule() starts over)."""
+    global _generation
+    with _lock:
+        _generation += 1
+
+
+def _current(generation):
+    with _lock:
+        if generation == _generation:
+            return True
+        _stats["canceled"] += 1
+        return False
+
+
+def _prefetch_page(generation, params):
+    try:
+        if not _current(generation):
+            return
+        # same kwargs => same response cache key; kind="prefetch" keeps it out
+        # of the interactive lane that downloads yield bandwidth to
+        resp = api.search_models(**params, kind="prefetch")
+        data_list = resp.get("data") or []
+        if not data_list:
+            with _lock:
+                _pages.discard(params["page"])
+            return
+        with _lock:
+            _stats["pages_prefetched"] += 1
+
+        for item in data_list[:gl.prefetch_max_thumbnails]:
+            file_path = api.preview_file_path(item)
+            if not file_path or thumbs.is_cached(file_path):
+                continue
+            if not _current(generation):
+                return
+            if thumbs.get_thumbnail(file_path, kind="prefetch"):
+                with _lock:
+                    _thumbs.add(file_path)
+                    _stats["thumbnails_prefetched"] += 1
+    except Exception as e:
+        gl.debug_print("Prefetch failed:", e)
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+    pages_seen = stats["page_hits"] + stats["page_misses"]
+    stats["page_hit_ratio"] = round(stats["page_hits"] / pages_seen, 3) if pages_seen else 0.0
+    return stats
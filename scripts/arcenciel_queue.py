@@ -0,0 +1,83 @@
+# scripts/arcenciel_queue.py
+from collections import OrderedDict, deque
+
+
+class DownloadQueue:
+    """
+    Pending downloads, bucketed by priority and then by host.
+
+      push()          O(1)
+      pop_runnable()  O(priorities + hosts), both tiny in practice
+
+    Within a priority, hosts are served round-robin and each host's items
+    first-come first-served, so one site with a long backlog can't starve another.
+
+    Not locked itself: the download scheduler guards it with its condition variable.
+    """
+
+    def __init__(self):
+        self._buckets = {}  # priority -> OrderedDict(host -> deque of items)
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        """Snapshot of queued items in the order they would run if no host were busy."""
+        items = []
+        for priority in sorted(self._buckets):
+            hosts = self._buckets[priority]
+            items.extend(item for host_items in hosts.values() for item in host_items)
+        return iter(items)
+
+    def push(self, item):
+        hosts = self._buckets.setdefault(item["priority"], OrderedDict())
+        host_items = hosts.get(item["host"])
+        if host_items is None:
+            host_items = hosts[item["host"]] = deque()
+        host_items.append(item)
+        self._len += 1
+
+    def pop_runnable(self, host_is_busy):
+        """
+        Remove and return the next item whose host isn't busy, or None.
+        'host_is_busy' is a callable host -> bool.
+        """
+        for priority in sorted(self._buckets):
+            hosts = self._buckets[priority]
+            for host in list(hosts):
+                if host_is_busy(host):
+                    continue
+                host_items = hosts[host]
+                item = host_items.popleft()
+                if host_items:
+                    hosts.move_to_end(host)  # round-robin: this host goes to the back
+                else:
+                    del hosts[host]
+                if not hosts:
+                    del self._buckets[priority]
+                self._len -= 1
+                return item
+        return None
+
+    def remove(self, key):
+        """Remove and return the queued item with this key, or None."""
+        for priority, hosts in list(self._buckets.items()):
+            for host, host_items in list(hosts.items()):
+                for item in host_items:
+                    if item["key"] == key:
+                        host_items.remove(item)
+                        if not host_items:
+                            del hosts[host]
+                        if not hosts:
+                            del self._buckets[priority]
+                        self._len -= 1
+                        return item
+        return None
+
+    def clear(self):
+        """Empty the queue, returning the items that were in it."""
+        items = list(self)
+        self._buckets.clear()
+        self._len = 0
+        return items
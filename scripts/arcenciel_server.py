@@ -1,11 +1,23 @@
 # scripts/arcenciel_server.py
 
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import scripts.arcenciel_download as dl
 import scripts.arcenciel_api as api
+import scripts.arcenciel_api_async as api_async
 import scripts.arcenciel_gui as gui
 import scripts.arcenciel_paths as path_utils
 import scripts.arcenciel_global as gl
+import scripts.arcenciel_http as http
+import scripts.arcenciel_cache as cache
+import scripts.arcenciel_thumbs as thumbs
+import scripts.arcenciel_prefetch as prefetch
+import scripts.arcenciel_card_updates as card_updates
+import scripts.arcenciel_download_status as download_status
+import scripts.arcenciel_library as library
+import scripts.arcenciel_catalog as catalog
+import scripts.arenciel_file_manage as file_manage
 import os
 
 route_registered = False  # A global guard so we don't define routes multiple times in the same session
@@ -24,6 +36,32 @@ def ensure_server_routes(app: FastAPI):
     def ping_route():
         return {"status": "ok"}
 
+    @app.get("/arcenciel/stats")
+    def stats_route():
+        return {
+            "http": http.get_stats(),
+            "api": api.get_stats(),
+            "responses": cache.get_stats(),
+            "thumbnails": thumbs.get_stats(),
+            "prefetch": prefetch.get_stats(),
+            "downloads": dl.get_stats(),
+            "library": library.get_stats(),
+            "catalog": catalog.get_stats(),
+        }
+
+    @app.get("/arcenciel/thumb/{file_path:path}")
+    def arcenciel_thumb_route(file_path: str):
+        # Served from the local store, fetched from arcenciel.io on first use.
+        # Thumbnails never change for a given filePath, so browsers may keep them.
+        local_path, content = thumbs.load_thumbnail(file_path)
+        headers = {"Cache-Control": f"public, max-age={gl.thumb_browser_max_age}, immutable"}
+        if local_path is not None:
+            return FileResponse(local_path, media_type="image/webp", headers=headers)
+        if content is not None:
+            # Fetched, but the store couldn't take it (disk full?): serve it anyway
+            return Response(content=content, media_type="image/webp", headers=headers)
+        return Response(status_code=404)
+
     @app.post("/arcenciel/download_with_extension")
     async def download_with_extension(request: Request):
         data = await request.json()
@@ -63,22 +101,112 @@ def ensure_server_routes(app: FastAPI):
         if "arcenciel.io" in url.lower() and model_id and version_id:
             final_url = f"https://arcenciel.io/api/models/{model_id}/versions/{version_id}/download"
 
-        dl.queue_download(model_id, version_id, final_url, local_path)
+        # Already on disk somewhere? Known from the library index, no file is read.
+        # on_duplicate: "ask" (default) => tell the browser, which asks the user;
+        # "link" => hardlink/copy the local file here; "download" => fetch anyway.
+        expected_sha256 = (data.get("sha256"), data.get("sha256webui"))
+        on_duplicate = data.get("on_duplicate", "ask")
+        if on_duplicate != "download":
+            # Off the event loop: the first call loads the library index, and each hit is stat'ed
+            existing = await run_in_threadpool(library.find_by_sha256, expected_sha256)
+            if os.path.abspath(local_path) in existing:
+                return {"status": "exists", "message": f"{file_name} is already downloaded at {local_path}"}
+            if existing:
+                source = existing[0]
+                if on_duplicate != "link":
+                    return {
+                        "status": "duplicate",
+                        "existing_path": source,
+                        "target_path": local_path,
+                        "message": f"{file_name} already exists at {source}",
+                    }
+                try:
+                    # A copy (no hardlink across drives) can take minutes: keep it off the event loop
+                    method = await run_in_threadpool(file_manage.link_or_copy, source, local_path)
+                except OSError as e:
+                    return {"error": f"Could not link {source} => {local_path}: {e}"}
+                await run_in_threadpool(library.record_copy, source, local_path, model_id, version_id, model_type)
+                return {"status": "linked", "message": f"Linked {source} => {local_path} ({method})"}
+
+        key = dl.download_key(model_id, version_id)
+        in_flight = dl.get_download_status(key) in ("queued", "active", "paused")
+        handle = dl.queue_download(model_id, version_id, final_url, local_path,
+                                   model_type=model_type, priority=data.get("priority"),
+                                   expected_sha256=expected_sha256)
         dl.start_downloads()
 
-        return {"message": f"Queued download for {file_name} => {local_path}"}
+        if in_flight:
+            return {"status": "coalesced",
+                    "message": f"Already downloading {file_name} => {handle.item['filename']}"}
+        return {"status": "queued", "message": f"Queued download for {file_name} => {local_path}"}
+
+    @app.get("/arcenciel/downloads")
+    def arcenciel_downloads_route():
+        # Shared snapshot, rebuilt at most every gl.download_status_interval
+        return Response(content=download_status.snapshot_json(), media_type="application/json")
+
+    # Registered before the {action} route below, which would otherwise match /limit
+    @app.post("/arcenciel/downloads/{model_id}/{version_id}/limit")
+    async def arcenciel_download_limit_route(model_id: str, version_id: str, request: Request):
+        # {"rate": bytes per second, 0 = unlimited, null = the global per-download default}
+        data = await request.json()
+        rate = data.get("rate")
+        key = dl.download_key(model_id, version_id)
+        try:
+            ok = dl.set_download_rate_limit(key, None if rate is None else int(rate))
+        except (TypeError, ValueError):
+            return {"key": key, "ok": False, "error": "rate must be a number of bytes per second"}
+        return {"key": key, "ok": ok}
+
+    @app.post("/arcenciel/downloads/{model_id}/{version_id}/{action}")
+    def arcenciel_download_control_route(model_id: str, version_id: str, action: str):
+        controls = {
+            "cancel": dl.cancel_download,
+            "pause": dl.pause_download,
+            "resume": dl.resume_download,
+        }
+        if action not in controls:
+            return Response(status_code=404)
+        key = dl.download_key(model_id, version_id)
+        ok = controls[action](key)
+        return {"key": key, "ok": ok, "status": dl.get_download_status(key)}
+
+    @app.get("/arcenciel/downloads/stream")
+    async def arcenciel_downloads_stream_route(request: Request):
+        return StreamingResponse(
+            download_status.stream(request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.get("/arcenciel/search_updates/{search_id}")
+    async def arcenciel_search_updates_route(search_id: str, since: int = 0):
+        """
+        Long-poll for card patches of one search. Returns every update past
+        'since' plus the new cursor; 'done' tells the client to stop polling.
+        """
+        channel = card_updates.get_channel(search_id)
+        if channel is None:
+            return {"updates": [], "cursor": since, "done": True}
+        await channel.wait(since, gl.card_update_poll_timeout)
+        updates, cursor, done = channel.read(since)
+        return {"updates": updates, "cursor": cursor, "done": done}
 
     @app.get("/arcenciel/model_details/{model_id}")
-    def arcenciel_model_details_route(model_id: int):
-        data = api.fetch_model_details(model_id)
+    async def arcenciel_model_details_route(model_id: int):
+        # Details and gallery are independent: fetch both at once
+        data, gallery_resp = await api_async.fetch_model_details_with_gallery(model_id)
         if "error" in data:
             return Response(content=f"<div>Error: {data['error']}</div>", media_type="text/html")
-        html = gui.build_model_details_html(data)
+        if "error" in gallery_resp:
+            gallery_resp = {}  # render without a gallery, as before
+        # Rendering touches the disk (subfolder index, paths, library index): keep it off the loop
+        html = await run_in_threadpool(gui.build_model_details_html, data, gallery_resp=gallery_resp)
         return Response(content=html, media_type="text/html")
 
     @app.get("/arcenciel/image_details/{image_id}")
-    def arcenciel_image_details_route(image_id: int):
-        img_data = api.fetch_image_details(image_id)
+    async def arcenciel_image_details_route(image_id: int):
+        img_data = await api_async.fetch_image_details(image_id)
         if "error" in img_data:
             return Response(content=f"<div>Error: {img_data['error']}</div>", media_type="text/html")
         html = gui.build_image_details_html(img_data)
@@ -88,5 +216,8 @@ def on_app_started(demo, app: FastAPI):
     """
     Called once at full startup. We'll call ensure_server_routes here,
     so on normal runs, routes are defined initially.
+    Downloads left unfinished by the previous run are picked up again here.
     """
     ensure_server_routes(app)
+    dl.restore_downloads()
+    library.refresh_in_background()  # so the first search already has install badges
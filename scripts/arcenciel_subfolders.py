@@ -0,0 +1,150 @@
+# scripts/arcenciel_subfolders.py
+import os
+import html
+import time
+import threading
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_paths as path_utils
+
+# Subfolder suggestions for the "Download with Extension" inputs.
+# Each model root gets one SubfolderIndex, shared by every render; the
+# <datalist> HTML is rebuilt only when a root's folders actually change.
+
+
+class SubfolderIndex:
+    """
+    Every subfolder under one model root, kept in memory between renders.
+    Built once with os.scandir. Later refreshes stat only the directories
+    already known and rescan the ones whose mtime moved (a directory's mtime
+    changes when an entry directly inside it is added, removed or renamed),
+    at most once per gl.subfolder_refresh_interval.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.version = 0  # bumped whenever the set of subfolders changes
+        self._dirs = {}   # rel path ("" is the root) -> (mtime_ns, [child rel paths])
+        self._sorted = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _abs(self, rel):
+        return os.path.join(self.root, rel) if rel else self.root
+
+    def _drop(self, rel):
+        """Forget 'rel' and everything below it. Needs self._lock."""
+        prefix = rel + "/"
+        for key in [k for k in self._dirs if k == rel or k.startswith(prefix)]:
+            del self._dirs[key]
+
+    def _scan(self, rel):
+        """(Re)read one directory, then any subdirectory not indexed yet. Needs self._lock."""
+        stack = [rel]
+        while stack:
+            rel = stack.pop()
+            path = self._abs(rel)
+            try:
+                # stat first: a change during the scan shows up on the next refresh
+                mtime = os.stat(path).st_mtime_ns
+                children = []
+                with os.scandir(path) as it:
+                    for entry in it:
+                        try:
+                            # Like os.walk: symlinked folders aren't descended into or listed
+                            if entry.is_dir(follow_symlinks=False):
+                                children.append(f"{rel}/{entry.name}" if rel else entry.name)
+                        except OSError:
+                            continue
+            except OSError:
+                self._drop(rel)
+                continue
+
+            old = self._dirs.get(rel)
+            if old:
+                for gone in set(old[1]) - set(children):
+                    self._drop(gone)
+            self._dirs[rel] = (mtime, children)
+            stack.extend(child for child in children if child not in self._dirs)
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if self._dirs and not force and now - self._checked < gl.subfolder_refresh_interval:
+                return
+            self._checked = now
+            before = set(self._dirs)
+
+            if not self._dirs:
+                self._scan("")
+            else:
+                for rel, (mtime, _) in list(self._dirs.items()):
+                    if rel not in self._dirs:
+                        continue  # dropped along with a parent in this pass
+                    try:
+                        changed = os.stat(self._abs(rel)).st_mtime_ns != mtime
+                    except OSError:
+                        self._drop(rel)
+                        continue
+                    if changed:
+                        self._scan(rel)
+
+            if set(self._dirs) != before:
+                self.version += 1
+                self._sorted = None
+
+    def subfolders(self):
+        """Sorted relative paths ("a", "a/b", ...), excluding the root itself."""
+        self.refresh()
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(rel for rel in self._dirs if rel)
+            return self._sorted
+
+
+_lock = threading.Lock()
+_indexes = {}    # abs root -> SubfolderIndex
+_datalists = {}  # model type -> (root, index version, html)
+
+
+def get_index(root):
+    root = os.path.abspath(root)
+    with _lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = SubfolderIndex(root)
+    return index
+
+
+def model_root(model_type):
+    """The configured folder for a model type, or None if it isn't a directory."""
+    base_dir = path_utils.load_paths().get((model_type or "").upper())
+    if not base_dir or not os.path.isdir(base_dir):
+        return None
+    return base_dir
+
+
+def datalist_id(model_type):
+    return f"arcen_subfolders_{model_type.lower()}"
+
+
+def datalist_html(model_type):
+    """<datalist> of every subfolder under the model type's root ("" if it has none)."""
+    root = model_root(model_type)
+    if root is None:
+        return ""
+    index = get_index(root)
+    subfolders = index.subfolders()
+    with _lock:
+        cached = _datalists.get(model_type)
+        if cached and cached[0] == index.root and cached[1] == index.version:
+            return cached[2]
+    option_lines = "".join(f'<option value="{html.escape(sf, quote=True)}"/>\n' for sf in subfolders)
+    result = f"""
+    <datalist id="{datalist_id(model_type)}">
+      {option_lines}
+    </datalist>
+    """
+    with _lock:
+        _datalists[model_type] = (index.root, index.version, result)
+    return result
@@ -0,0 +1,196 @@
+# scripts/arcenciel_thumbs.py
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import quote
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_http as http
+
+THUMB_CACHE_DIR = Path(__file__).parent.parent / "cache" / "thumbnails"
+# ^ Content-addressed store under the extension root folder
+
+# Base URL for image files (same as arcenciel_api.THUMBNAIL_BASE_URL)
+THUMBNAIL_BASE_URL = "https://arcenciel.io/uploads"
+# Local route that serves the store, see arcenciel_server.py
+LOCAL_ROUTE = "/arcenciel/thumb"
+
+_lock = threading.Lock()
+_index = None          # OrderedDict name -> size, least recently used first
+_total_bytes = 0
+_fetch_locks = {}      # name -> [Lock, threads using it], so concurrent requests fetch a thumbnail once
+_stats = {"hits": 0, "fetches": 0, "fetch_errors": 0, "store_errors": 0, "evictions": 0}
+
+
+def normalize_file_path(file_path):
+    """
+    Remote 'filePath' as used in the store key and routes: no leading slash,
+    forward slashes only. Returns "" for anything that could escape /uploads.
+    """
+    file_path = (file_path or "").replace("\\", "/").lstrip("/")
+    if not file_path or any(part == ".." for part in file_path.split("/")):
+        return ""
+    return file_path
+
+
+def remote_url(file_path):
+    file_base, _ = os.path.splitext(normalize_file_path(file_path))
+    return f"{THUMBNAIL_BASE_URL}/{file_base}.thumbnail.webp"
+
+
+def local_url(file_path):
+    """Short URL the browser can load (and cache) instead of a base64 data URL."""
+    file_path = normalize_file_path(file_path)
+    if not file_path:
+        return None
+    return f"{LOCAL_ROUTE}/{quote(file_path)}"
+
+
+def _name_for(file_path):
+    return hashlib.sha1(normalize_file_path(file_path).encode("utf-8")).hexdigest() + ".webp"
+
+
+def _load_index():
+    """Build the LRU index from the files on disk, oldest mtime first. Needs _lock."""
+    global _index, _total_bytes
+    if _index is not None:
+        return _index
+    files = []
+    if THUMB_CACHE_DIR.is_dir():
+        for entry in os.scandir(THUMB_CACHE_DIR):
+            if entry.is_file() and entry.name.endswith(".webp"):
+                st = entry.stat()
+                files.append((st.st_mtime, entry.name, st.st_size))
+    files.sort()
+    _index = OrderedDict((name, size) for _, name, size in files)
+    _total_bytes = sum(size for _, _, size in files)
+    return _index
+
+
+def _evict():
+    """Remove least recently used thumbnails until under gl.thumb_cache_max_bytes. Needs _lock."""
+    global _total_bytes
+    index = _load_index()
+    while index and _total_bytes > gl.thumb_cache_max_bytes:
+        name, size = index.popitem(last=False)
+        _total_bytes -= size
+        _stats["evictions"] += 1
+        try:
+            os.remove(THUMB_CACHE_DIR / name)
+        except OSError:
+            pass
+
+
+def is_cached(file_path):
+    """True if the thumbnail is in the store. Unlike cached_path, leaves stats and LRU order alone."""
+    name = _name_for(file_path)
+    with _lock:
+        return name in _load_index()
+
+
+def cached_path(file_path):
+    """Local path of the thumbnail if it's already in the store, else None. Never fetches."""
+    name = _name_for(file_path)
+    with _lock:
+        index = _load_index()
+        if name not in index:
+            return None
+        index.move_to_end(name)
+        _stats["hits"] += 1
+    path = THUMB_CACHE_DIR / name
+    try:
+        os.utime(path)  # keeps LRU order across restarts
+    except OSError:
+        return None
+    return path
+
+
+def get_thumbnail(file_path, kind="thumbnail"):
+    """
+    Local path of the thumbnail for remote 'filePath', fetching it on a miss.
+    Returns None if it can't be fetched (or stored). 'kind' is the
+    arcenciel_http traffic kind.
+    """
+    return load_thumbnail(file_path, kind)[0]
+
+
+def load_thumbnail(file_path, kind="thumbnail"):
+    """
+    (path, None) once the thumbnail is in the store, (None, bytes) if it was
+    fetched but couldn't be written there (disk full, permissions),
+    (None, None) if it couldn't be fetched.
+    """
+    if not normalize_file_path(file_path):
+        return None, None
+    path = cached_path(file_path)
+    if path is not None:
+        return path, None
+
+    name = _name_for(file_path)
+    with _lock:
+        entry = _fetch_locks.setdefault(name, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            # Another thread may have fetched it while we waited
+            path = cached_path(file_path)
+            if path is not None:
+                return path, None
+            return _fetch(file_path, name, kind)
+    finally:
+        with _lock:
+            # Dropped only by the last user, so a later caller can't get a
+            # second lock for a fetch that is still running
+            entry[1] -= 1
+            if not entry[1]:
+                del _fetch_locks[name]
+
+
+def _fetch(file_path, name, kind):
+    global _total_bytes
+    try:
+        r = http.get(remote_url(file_path), kind=kind)
+        r.raise_for_status()
+        content = r.content
+    except Exception as e:
+        with _lock:
+            _stats["fetch_errors"] += 1
+        gl.debug_print("Error downloading preview:", e)
+        return None, None
+
+    path = THUMB_CACHE_DIR / name
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        THUMB_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        with _lock:
+            _stats["store_errors"] += 1
+        gl.debug_print(f"Could not store thumbnail {file_path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return None, content
+
+    with _lock:
+        index = _load_index()
+        old_size = index.pop(name, 0)
+        index[name] = len(content)
+        _total_bytes += len(content) - old_size
+        _stats["fetches"] += 1
+        _evict()
+    return path, None
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        index = _load_index()
+        stats["entries"] = len(index)
+        stats["bytes"] = _total_bytes
+    return stats
@@ -1,12 +1,18 @@
 import os
 import re
 import json
-import base64
+import shutil
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import gradio as gr
 from bs4 import BeautifulSoup
-from modules.hashes import calculate_sha256
 
 import scripts.arcenciel_api as api
+import scripts.arcenciel_hash_cache as hash_cache
+import scripts.arcenciel_hashing as hashing
+import scripts.arcenciel_library as library
+import scripts.arcenciel_catalog as catalog
 import scripts.arcenciel_paths as path_utils
 import scripts.arcenciel_global as gl
 
@@ -28,26 +34,88 @@ def clean_description(desc: str) -> str:
     return text.strip()
 
 
-def gather_files_recursive(dir_path, exts):
+def match_model_version(sha_val):
     """
-    Recursively scan 'dir_path' for files whose extension is in 'exts' 
-    and return a list of full file paths.
+    Look 'sha_val' up on ArcEnCiel.
+    Returns (model, version, None) on a match, or (None, None, reason) otherwise.
     """
-    matched = []
-    for root, dirs, files in os.walk(dir_path):
-        for fname in files:
-            if fname.lower().endswith(exts):
-                matched.append(os.path.join(root, fname))
-    return matched
+    resp = api.search_models(search_term=sha_val, limit=5)
+    if not resp or "data" not in resp or not resp["data"]:
+        return None, None, "No ArcEnCiel match"
+
+    for m in resp["data"]:
+        for ver in m.get("versions", []):
+            if ver.get("sha256") == sha_val or ver.get("sha256webui") == sha_val:
+                return m, ver, None
+
+    return None, None, "Found models, but none had a matching version"
+
+
+def write_model_sidecars(fpath, sha_val, matched_model, matched_version, need_json, need_preview):
+    """
+    Write the JSON sidecar and/or preview image next to 'fpath'.
+    Returns a list of progress lines.
+    """
+    lines = []
+    fname = os.path.basename(fpath)
+    base_no_ext, _ = os.path.splitext(fpath)
+    json_path = base_no_ext + ".json"
+    preview_path = base_no_ext + ".png"
+
+    if need_json:
+        model_id = matched_model.get("id", 0)
+        raw_desc = matched_model.get("description", "No description")
+        desc_text = clean_description(raw_desc)
+
+        base_model_str = matched_version.get("baseModel", "Other")
+        version_id = matched_version.get("id", 0)
+        activation_tags = matched_version.get("activationTags", [])
+        activation_text = "\n\n".join(activation_tags)
+
+        json_data = {
+            "sha256": sha_val,
+            "modelId": model_id,
+            "modelVersionId": version_id,
+            "activation text": activation_text,
+            "description": desc_text,
+            "sd version": base_model_str,
+        }
+
+        try:
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(json_data, f, indent=2)
+            lines.append(f"<p style='color:green;'>Wrote JSON => {os.path.basename(json_path)}</p>")
+        except Exception as e:
+            lines.append(f"<p style='color:red;'>Error writing JSON {os.path.basename(json_path)}: {e}</p>")
+
+    if need_preview:
+        fake_item = {"versions": [matched_version]}
+        thumb_path = api.download_preview_file(fake_item)
+        if thumb_path:
+            try:
+                shutil.copyfile(thumb_path, preview_path)
+                lines.append(f"<p style='color:green;'>Downloaded preview => {os.path.basename(preview_path)}</p>")
+            except Exception as e:
+                lines.append(f"<p style='color:red;'>Error saving preview for {fname}: {e}</p>")
+        else:
+            lines.append(f"<p style='color:orange;'>No preview available for {fname}.</p>")
+
+    return lines
 
 
 def create_jsons_for_models(
     lora_sel, cpt_sel, vae_sel, emb_sel, seg_sel, oth_sel,
-    overwrite_json, download_preview
+    overwrite_json, download_preview, sequential_hashing=False,
+    lookup_in_flight=None
 ):
     """
     Generator function that:
       - Loads path presets, scans selected dirs (recursively) for model files.
+      - Runs a three-stage pipeline so network latency hides behind hashing:
+         1. hash producer: cache hits first, then misses on the parallel hashing
+            engine (or one at a time if 'sequential_hashing' is set, for spinning disks)
+         2. lookup stage: up to 'lookup_in_flight' concurrent ArcEnCiel searches
+         3. writer stage: JSON sidecar and/or preview image for each match
       - For each file:
          * If user wants JSON and none exists (or Overwrite is on), create/update JSON.
          * If user wants preview image and none exists, download it.
@@ -70,15 +138,14 @@ def create_jsons_for_models(
         yield "<p style='color:red;'>No categories selected. Aborting.</p>"
         return
 
-    # Recursively gather model files
-    exts = (".safetensors", ".ckpt", ".bin", ".pt")
+    # Recursively gather model files; the library index only relists folders that changed
     model_files = []
     for key in selected_keys:
         p = paths_dict.get(key)
         if not p or not os.path.isdir(p):
             yield f"<p style='color:orange;'>Path for {key} is not set or invalid: {p}</p>"
             continue
-        model_files.extend(gather_files_recursive(p, exts))
+        model_files.extend((key, f) for f in library.scan(p, key))
 
     total_count = len(model_files)
     if total_count == 0:
@@ -86,97 +153,147 @@ def create_jsons_for_models(
         return
 
     yield f"<p>Found {total_count} model files. Beginning checks...</p>"
+    stats_before = hash_cache.get_stats()
 
-    for idx, fpath in enumerate(model_files, start=1):
+    # Pass 1: decide what each file needs; answer hashes from the cache where possible
+    pending = {}     # fpath -> (need_json, need_preview)
+    cached = {}      # fpath -> sha256, for cache hits
+    to_hash = {}     # fpath -> model type, for cache misses
+    for idx, (key, fpath) in enumerate(model_files, start=1):
         fname = os.path.basename(fpath)
-        yield f"<p>[{idx}/{total_count}] Checking: {fname}</p>"
-
         base_no_ext, _ = os.path.splitext(fpath)
-        json_path = base_no_ext + ".json"
-        preview_path = base_no_ext + ".png"
-
-        need_json = overwrite_json or not os.path.exists(json_path)
-        need_preview = download_preview and not os.path.exists(preview_path)
+        need_json = overwrite_json or not os.path.exists(base_no_ext + ".json")
+        need_preview = download_preview and not os.path.exists(base_no_ext + ".png")
 
         if not need_json and not need_preview:
-            yield f"<p style='color:blue;'>Nothing to do for {fname}, skipping.</p>"
+            yield f"<p style='color:blue;'>[{idx}/{total_count}] Nothing to do for {fname}, skipping.</p>"
             continue
 
-        try:
-            sha_val = calculate_sha256(fpath)
-        except Exception as e:
-            yield f"<p style='color:red;'>Error hashing {fname}: {e}</p>"
-            continue
+        pending[fpath] = (need_json, need_preview)
+        sha_val = hash_cache.lookup(fpath, key)
+        if sha_val:
+            cached[fpath] = sha_val
+            library.record_hash(fpath, sha_val, key)
+        else:
+            to_hash[fpath] = key
 
-        resp = api.search_models(search_term=sha_val, limit=5)
-        if not resp or "data" not in resp or not resp["data"]:
-            yield f"<p>No ArcEnCiel match => skipping {fname}.</p>"
-            continue
+    if not pending:
+        yield "<p>Done processing all models in selected categories.</p>"
+        return
 
-        matched_model = None
-        matched_version = None
-        for m in resp["data"]:
-            for ver in m.get("versions", []):
-                if ver.get("sha256") == sha_val or ver.get("sha256webui") == sha_val:
-                    matched_model = m
-                    matched_version = ver
-                    break
-            if matched_model:
-                break
-
-        if not matched_model or not matched_version:
-            yield f"<p>Found models, but none had a matching version => skipping {fname}.</p>"
-            continue
+    if to_hash:
+        yield f"<p>Hashing {len(to_hash)} files not found in the hash cache...</p>"
+
+    # Pass 2: hash => lookup => write pipeline. Stage threads only post events;
+    # this generator is the single consumer that turns them into UI output.
+    events = queue.Queue()  # ("lines", [html, ...]) or ("done", fpath)
+    cancel_event = threading.Event()
+    lookup_pool = ThreadPoolExecutor(
+        max_workers=max(1, int(lookup_in_flight or gl.lookup_max_in_flight)),
+        thread_name_prefix="arcen_lookup",
+    )
+    writer_pool = ThreadPoolExecutor(
+        max_workers=max(1, gl.sidecar_writer_workers),
+        thread_name_prefix="arcen_sidecar",
+    )
+
+    def _write_stage(fpath, sha_val, model, version):
+        try:
+            need_json, need_preview = pending[fpath]
+            events.put(("lines", write_model_sidecars(fpath, sha_val, model, version, need_json, need_preview)))
+        except Exception as e:
+            events.put(("lines", [f"<p style='color:red;'>Error writing sidecars for {os.path.basename(fpath)}: {e}</p>"]))
+        finally:
+            events.put(("done", fpath))
 
-        if need_json:
-            model_id = matched_model.get("id", 0)
-            raw_desc = matched_model.get("description", "No description")
-            desc_text = clean_description(raw_desc)
-
-            base_model_str = matched_version.get("baseModel", "Other")
-            version_id = matched_version.get("id", 0)
-            activation_tags = matched_version.get("activationTags", [])
-            activation_text = "\n\n".join(activation_tags)
-
-            json_data = {
-                "sha256": sha_val,
-                "modelId": model_id,
-                "modelVersionId": version_id,
-                "activation text": activation_text,
-                "description": desc_text,
-                "sd version": base_model_str,
-            }
+    def _lookup_stage(fpath, sha_val):
+        fname = os.path.basename(fpath)
+        try:
+            if cancel_event.is_set():
+                return
+            model, version, reason = match_model_version(sha_val)
+            if model:
+                library.record_match(fpath, model.get("id"), version.get("id"))
+                events.put(("lines", [f"<p>Matched {fname} => {model.get('title', model.get('id'))}</p>"]))
+                writer_pool.submit(_write_stage, fpath, sha_val, model, version)
+                return
+            events.put(("lines", [f"<p>{reason} => skipping {fname}.</p>"]))
+        except Exception as e:
+            events.put(("lines", [f"<p style='color:red;'>Error looking up {fname}: {e}</p>"]))
+        events.put(("done", fpath))
 
-            try:
-                with open(json_path, "w", encoding="utf-8") as f:
-                    json.dump(json_data, f, indent=2)
-                yield f"<p style='color:green;'>Wrote JSON => {os.path.basename(json_path)}</p>"
-            except Exception as e:
-                yield f"<p style='color:red;'>Error writing JSON {os.path.basename(json_path)}: {e}</p>"
-
-        if need_preview:
-            fake_item = {"versions": [matched_version]}
-            data_url = api.download_preview_image(fake_item)
-            if data_url:
-                try:
-                    raw_b64 = data_url.split(",", 1)[1]
-                    raw_data = base64.b64decode(raw_b64)
-                    with open(preview_path, "wb") as imgf:
-                        imgf.write(raw_data)
-                    yield f"<p style='color:green;'>Downloaded preview => {os.path.basename(preview_path)}</p>"
-                except Exception as e:
-                    yield f"<p style='color:red;'>Error saving preview for {fname}: {e}</p>"
+    def _hash_stage():
+        handled = set()
+        try:
+            for fpath, sha_val in cached.items():
+                lookup_pool.submit(_lookup_stage, fpath, sha_val)
+            for fpath, sha_val, err in hashing.hash_files(
+                list(to_hash), sequential=sequential_hashing or None, cancel_event=cancel_event
+            ):
+                handled.add(fpath)
+                fname = os.path.basename(fpath)
+                if err is not None:
+                    events.put(("lines", [f"<p style='color:red;'>Error hashing {fname}: {err}</p>"]))
+                    events.put(("done", fpath))
+                    continue
+                hash_cache.store(fpath, sha_val, to_hash[fpath])
+                library.record_hash(fpath, sha_val, to_hash[fpath])
+                events.put(("lines", [f"<p>[{len(handled)}/{len(to_hash)}] Hashed: {fname}</p>"]))
+                lookup_pool.submit(_lookup_stage, fpath, sha_val)
+        except Exception as e:
+            if cancel_event.is_set():
+                return
+            events.put(("lines", [f"<p style='color:red;'>Hashing stopped: {e}</p>"]))
+            for fpath in to_hash:
+                if fpath not in handled:
+                    events.put(("done", fpath))
+
+    producer = threading.Thread(target=_hash_stage, daemon=True)
+    producer.start()
+
+    remaining = len(pending)
+    try:
+        while remaining:
+            kind, payload = events.get()
+            if kind == "lines":
+                for line in payload:
+                    yield line
             else:
-                yield f"<p style='color:orange;'>No preview available for {fname}.</p>"
-
+                remaining -= 1
+                yield f"<p>[{len(pending) - remaining}/{len(pending)}] Finished: {os.path.basename(payload)}</p>"
+    finally:
+        # Also runs if the UI abandons the generator: stop feeding new work
+        cancel_event.set()
+        lookup_pool.shutdown(wait=False, cancel_futures=True)
+        writer_pool.shutdown(wait=False)
+        hash_cache.save()
+        library.save()
+
+    stats = hash_cache.get_stats()
+    stats = {k: stats[k] - stats_before[k] for k in stats}
+    yield (
+        f"<p>Hash cache: {stats['hits']} hits, {stats['webui_hits']} from WebUI cache, "
+        f"{len(to_hash)} hashed, {stats['invalidated']} invalidated.</p>"
+    )
     yield "<p>Done processing all models in selected categories.</p>"
 
 
+def sync_catalog(full_resync=False):
+    """
+    Generator for the "Sync Offline Catalog" button: runs the catalog sync
+    and streams its progress lines to a Gradio HTML component.
+    """
+    yield "<p>Syncing the ArcEnCiel catalog...</p>"
+    for line in catalog.sync(full=bool(full_resync)):
+        yield f"<p>{line}</p>"
+
+
 def add_utilities_subtab():
     """
     Creates the 'Utilities' sub-tab for ArcEnCiel, with a 3-column layout:
       - Column A: Create JSON for models
-      - Column B/C: placeholders
+      - Column B: Offline catalog sync
+      - Column C: placeholder
     """
     with gr.Tab("Utilities"):
         gr.Markdown("### ArcEnCiel Utilities")
@@ -198,6 +315,11 @@ def add_utilities_subtab():
                 with gr.Row():
                     check_overwrite = gr.Checkbox(value=False, label="Overwrite existing JSON")
                     check_download_preview = gr.Checkbox(value=False, label="Download preview image")
+                    check_sequential = gr.Checkbox(value=False, label="Sequential hashing (spinning disks)")
+                lookup_slider = gr.Slider(
+                    label="Concurrent ArcEnCiel lookups",
+                    minimum=1, maximum=16, step=1, value=gl.lookup_max_in_flight
+                )
 
                 generate_json_btn = gr.Button("Create JSON for Models")
                 progress_html = gr.HTML(
@@ -215,16 +337,36 @@ def add_utilities_subtab():
                         check_seg,
                         check_oth,
                         check_overwrite,
-                        check_download_preview
+                        check_download_preview,
+                        check_sequential,
+                        lookup_slider
                     ],
                     outputs=[progress_html],
                     queue=True
                 )
 
-            # Column B: Placeholder
+            # Column B: Offline catalog mirror
             with gr.Box():
-                gr.Markdown("**Placeholder #2**")
-                gr.Markdown("Add future utilities here...")
+                gr.Markdown("**Sync Offline Catalog**")
+                gr.Markdown(
+                    "Mirror ArcEnCiel's model list locally, so the Browser's "
+                    "\"Search offline mirror\" option can search it without the API. "
+                    "A normal sync picks up new uploads; edits to older models "
+                    "arrive with a full resync (run automatically every week)."
+                )
+                check_full_resync = gr.Checkbox(value=False, label="Full resync (also drops removed models)")
+                sync_catalog_btn = gr.Button("Sync Offline Catalog")
+                sync_progress_html = gr.HTML(
+                    "Not synced this session.",
+                    elem_id="arcenciel_catalog_progress"
+                )
+
+                sync_catalog_btn.click(
+                    fn=sync_catalog,
+                    inputs=[check_full_resync],
+                    outputs=[sync_progress_html],
+                    queue=True
+                )
 
             # Column C: Placeholder
             with gr.Box():
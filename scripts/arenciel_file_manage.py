@@ -1,8 +1,9 @@
 # scripts/arcenciel_file_manage.py
 import os
-import hashlib
 import json
+import shutil
 import scripts.arcenciel_global as gl
+from scripts.arcenciel_hashing import hash_file
 
 def make_dir(path):
     if not os.path.exists(path):
@@ -10,15 +11,28 @@ def make_dir(path):
 
 def gen_sha256(file_path):
     """Compute sha256 of file_path if it exists."""
-    sha = hashlib.sha256()
     try:
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(65536), b""):
-                sha.update(chunk)
-        return sha.hexdigest()
+        return hash_file(file_path)
     except:
         return None
 
+def link_or_copy(src, dst):
+    """
+    Put a copy of 'src' at 'dst' without downloading it again: a hardlink when
+    both are on the same volume, else a real copy. Returns "hardlink" or "copy".
+    """
+    if os.path.exists(dst):
+        raise FileExistsError(f"{dst} already exists")
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        # Different drive, or a filesystem without hardlinks
+        tmp_path = dst + ".part"
+        shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, dst)
+        return "copy"
+
 def save_model_info(model_id, version_id, local_json_path, extra_data=None):
     """Store metadata in a local .json sidecar."""
     data = {
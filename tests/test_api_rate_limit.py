@@ -0,0 +1,53 @@
+# tests/test_api_rate_limit.py
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_http as http
+import scripts.arcenciel_api as api
+
+
+@pytest.fixture
+def rate_limited_server():
+    """Local stand-in for the API that answers every request with 429 + Retry-After."""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            body = b'{"error": "rate limited"}'
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", hits
+    server.shutdown()
+    server.server_close()
+
+
+def test_429_reaches_the_shared_back_off(monkeypatch, rate_limited_server):
+    base, hits = rate_limited_server
+    noted = []
+    real_note = api.note_rate_limited
+    monkeypatch.setattr(api, "ARC_API_BASE", base)
+    monkeypatch.setattr(api, "note_rate_limited", lambda value: (noted.append(value), real_note(value)))
+    monkeypatch.setattr(gl, "api_rate_limit_retries", 1)
+    monkeypatch.setattr(http, "_session", None)  # rebuilt with the current Retry policy
+
+    result = api.request_arc_api("/models/search", {"search": "429"})
+
+    assert "error" in result
+    assert len(hits) == 2     # first try + one retry by request_arc_api, none by urllib3
+    assert noted == ["0"]     # the second 429 is the last attempt and returned as an error
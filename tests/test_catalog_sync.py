@@ -0,0 +1,144 @@
+# tests/test_catalog_sync.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+pytest.importorskip("requests")
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_api as api
+import scripts.arcenciel_catalog as catalog
+
+
+def model(model_id, title=None, base="SDXL", model_type="LORA"):
+    return {
+        "id": model_id,
+        "title": title or f"model {model_id}",
+        "type": model_type,
+        "tags": [{"name": "tag"}],
+        "uploader": {"username": "someone"},
+        "versions": [{"baseModel": base}],
+    }
+
+
+class CatalogStub:
+    """
+    Local stand-in for /models/search (newest first) and /models/{id}.
+    'after_page' maps a page number to a callback run once that page is served.
+    """
+
+    def __init__(self, models):
+        self.models = list(models)
+        self.after_page = {}
+        self.lock = threading.Lock()
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                owner.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle(self, h):
+        url = urlparse(h.path)
+        if url.path == "/models/search":
+            query = parse_qs(url.query)
+            page, limit = int(query["page"][0]), int(query["limit"][0])
+            with self.lock:
+                ordered = sorted(self.models, key=lambda m: -m["id"])
+                body = {
+                    "data": ordered[(page - 1) * limit:page * limit],
+                    "total": len(ordered),
+                    "totalPages": max(1, -(-len(ordered) // limit)),
+                }
+                hook = self.after_page.pop(page, None)
+            self.send(h, 200, body)
+            if hook:
+                hook()
+            return
+        model_id = int(url.path.rsplit("/", 1)[1])
+        with self.lock:
+            found = [m for m in self.models if m["id"] == model_id]
+        self.send(h, 200 if found else 404, found[0] if found else {"error": "not found"})
+
+    def send(self, h, status, body):
+        data = json.dumps(body).encode()
+        h.send_response(status)
+        h.send_header("Content-Type", "application/json")
+        h.send_header("Content-Length", str(len(data)))
+        h.end_headers()
+        h.wfile.write(data)
+
+    def remove(self, model_id):
+        with self.lock:
+            self.models = [m for m in self.models if m["id"] != model_id]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    server = CatalogStub(model(i) for i in range(1, 7))
+    monkeypatch.setattr(catalog, "CATALOG_DB", tmp_path / "catalog.db")
+    monkeypatch.setattr(api, "ARC_API_BASE", server.base)
+    monkeypatch.setattr(gl, "catalog_sync_page_size", 2)
+    monkeypatch.setattr(gl, "catalog_sync_delay", 0)
+    monkeypatch.setattr(gl, "catalog_sync_quiet_pages", 1)
+    yield server
+    server.close()
+
+
+def mirrored_ids():
+    return sorted(m["id"] for m in catalog.search(limit=100)["data"])
+
+
+def test_first_sync_mirrors_everything(stub):
+    lines = list(catalog.sync())
+    assert lines[-1].startswith("Catalog synced: 6 new")
+    assert mirrored_ids() == [1, 2, 3, 4, 5, 6]
+    assert catalog.is_fresh()
+
+    stub.models.append(model(7, title="fresh upload", base="Pony"))
+    list(catalog.sync())
+    assert mirrored_ids() == [1, 2, 3, 4, 5, 6, 7]
+    found = catalog.search("fresh", base_model="Pony")
+    assert [m["id"] for m in found["data"]] == [7]
+
+
+def test_full_sync_drops_only_models_gone_upstream(stub):
+    list(catalog.sync())
+    stub.remove(2)
+    list(catalog.sync(full=True))
+    assert mirrored_ids() == [1, 3, 4, 5, 6]
+
+
+def test_models_shifted_past_during_the_walk_are_kept(stub):
+    list(catalog.sync())
+    # Once page 1 (6, 5) is out, 6 is removed: 4 moves up onto page 1 and the
+    # walk never sees it, yet it is still there upstream
+    stub.after_page[1] = lambda: stub.remove(6)
+    list(catalog.sync(full=True))
+    # 6 was seen before it went, so only the next full sync drops it
+    assert mirrored_ids() == [1, 2, 3, 4, 5, 6]
+
+
+def test_incremental_sync_turns_full_when_the_last_full_one_is_old(stub, monkeypatch):
+    list(catalog.sync())
+    stub.remove(1)
+    list(catalog.sync())
+    assert 1 in mirrored_ids()  # an incremental sync stops early and drops nothing
+
+    monkeypatch.setattr(gl, "catalog_full_sync_interval", 0)
+    lines = list(catalog.sync())
+    assert lines[0].startswith("Full sync")
+    assert 1 not in mirrored_ids()
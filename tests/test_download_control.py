@@ -0,0 +1,70 @@
+# tests/test_download_control.py
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("tqdm")
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_download as dl
+
+
+@pytest.fixture
+def fake_transfer(monkeypatch):
+    """
+    Replace do_download with a transfer that, like the real chunk loop, only
+    notices item["stop"] when the test lets it take its next chunk.
+    """
+    monkeypatch.setattr(gl, "journal_enabled", False)
+    started = threading.Event()
+    next_chunk = threading.Event()
+    runs = []
+
+    def do_download(item):
+        runs.append(item["stop_reason"])
+        if len(runs) > 1:
+            return "completed"
+        started.set()
+        next_chunk.wait(5)
+        if item["stop"].is_set():
+            return dl._stopped_status(item)
+        return "completed"
+
+    monkeypatch.setattr(dl, "do_download", do_download)
+    yield started, next_chunk, runs
+    next_chunk.set()
+    dl.cancel_all_downloads()
+
+
+def test_resume_right_after_pause_requeues(tmp_path, fake_transfer):
+    started, next_chunk, runs = fake_transfer
+    handle = dl.queue_download(1, 2, "http://example.invalid/file", str(tmp_path / "m.safetensors"))
+    dl.start_downloads()
+    assert started.wait(5)
+
+    # Both land before the transfer looks at its stop event again
+    assert handle.pause()
+    assert handle.resume()
+    assert handle.status == "active"
+    next_chunk.set()
+
+    assert handle.future.result(timeout=5) == "completed"
+    assert handle.status == "completed"
+    assert len(runs) == 2  # stopped as a pause, then re-queued and run again
+
+
+def test_pause_stays_paused(tmp_path, fake_transfer):
+    started, next_chunk, runs = fake_transfer
+    handle = dl.queue_download(3, 4, "http://example.invalid/file", str(tmp_path / "m.safetensors"))
+    dl.start_downloads()
+    assert started.wait(5)
+
+    assert handle.pause()
+    next_chunk.set()
+    for _ in range(50):
+        if handle.status == "paused":
+            break
+        threading.Event().wait(0.1)
+    assert handle.status == "paused"
+    assert not handle.future.done()
@@ -0,0 +1,91 @@
+# tests/test_download_part_files.py
+import os
+import errno
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("tqdm")
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_download as dl
+
+BODY = os.urandom(64 * 1024)
+
+
+def failing_fallocate(code):
+    def posix_fallocate(fd, offset, length):
+        raise OSError(code, os.strerror(code))
+    return posix_fallocate
+
+
+def test_preallocate_reports_a_full_drive(tmp_path, monkeypatch):
+    monkeypatch.setattr(os, "posix_fallocate", failing_fallocate(errno.ENOSPC), raising=False)
+    with open(tmp_path / "m.part", "wb") as f:
+        with pytest.raises(OSError) as info:
+            dl._preallocate(f, 1024)
+    assert info.value.errno == errno.ENOSPC
+    assert "not enough free space" in str(info.value)
+
+
+@pytest.mark.parametrize("code", [errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL])
+def test_preallocate_falls_back_where_unsupported(tmp_path, monkeypatch, code):
+    monkeypatch.setattr(os, "posix_fallocate", failing_fallocate(code), raising=False)
+    with open(tmp_path / "m.part", "wb") as f:
+        dl._preallocate(f, 1024)
+    assert os.path.getsize(tmp_path / "m.part") == 1024
+
+
+def test_preallocate_passes_other_errors_on(tmp_path, monkeypatch):
+    monkeypatch.setattr(os, "posix_fallocate", failing_fallocate(errno.EIO), raising=False)
+    with open(tmp_path / "m.part", "wb") as f:
+        with pytest.raises(OSError) as info:
+            dl._preallocate(f, 1024)
+    assert info.value.errno == errno.EIO
+
+
+class RangeRefusingHandler(BaseHTTPRequestHandler):
+    """Serves BODY, but answers every Range request with 416."""
+
+    def do_GET(self):
+        if self.headers.get("Range"):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(BODY)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def range_refusing_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeRefusingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/model.safetensors"
+    server.shutdown()
+    server.server_close()
+
+
+def test_unresumable_part_is_discarded_and_refetched(tmp_path, monkeypatch, range_refusing_url):
+    monkeypatch.setattr(gl, "download_free_space_margin", 0)
+    filename = str(tmp_path / "model.safetensors")
+    part_path, meta_path = dl._part_paths(filename)
+    # A stale .part from a remote file that has since changed
+    with open(part_path, "wb") as f:
+        f.write(b"x" * 100)
+    dl._save_part_meta(meta_path, {"url": range_refusing_url, "expected_length": 5000})
+
+    item = dl._new_item(1, 2, range_refusing_url, filename, None, 0, ())
+    assert dl._transfer_single(range_refusing_url, filename, part_path, meta_path, item) == "completed"
+    with open(part_path, "rb") as f:
+        assert f.read() == BODY
+    assert item["sha256"] == hashlib.sha256(BODY).hexdigest()
@@ -0,0 +1,84 @@
+# tests/test_download_scheduler.py
+import time
+import threading
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("tqdm")
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_download as dl
+
+THREADS = 16
+ITEMS_PER_THREAD = 50
+HOSTS = ("a.example", "b.example", "c.example", "d.example")
+
+
+def wait_until(predicate, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_scheduler_under_concurrent_enqueue(tmp_path, monkeypatch):
+    monkeypatch.setattr(gl, "journal_enabled", False)
+    monkeypatch.setattr(gl, "download_max_concurrent", 3)
+    monkeypatch.setattr(gl, "download_per_host_limit", 2)
+    monkeypatch.setattr(gl, "download_history_size", THREADS * ITEMS_PER_THREAD)
+    monkeypatch.setattr(gl, "futures_map", {})  # don't leave 800 finished items to later tests
+
+    lock = threading.Lock()
+    runs = Counter()
+    running = Counter()  # host -> transfers running now
+    peak = {"total": 0, "host": 0}
+
+    def do_download(item):
+        with lock:
+            runs[item["key"]] += 1
+            running[item["host"]] += 1
+            peak["total"] = max(peak["total"], sum(running.values()))
+            peak["host"] = max(peak["host"], running[item["host"]])
+        time.sleep(0.0005)
+        with lock:
+            running[item["host"]] -= 1
+        return "completed"
+
+    monkeypatch.setattr(dl, "do_download", do_download)
+
+    handles = []
+    handles_lock = threading.Lock()
+    go = threading.Barrier(THREADS)
+
+    def producer(t):
+        go.wait()
+        for i in range(ITEMS_PER_THREAD):
+            host = HOSTS[(t + i) % len(HOSTS)]
+            handle = dl.queue_download(t, i, f"https://{host}/{t}/{i}", str(tmp_path / f"{t}_{i}"))
+            dl.start_downloads()
+            with handles_lock:
+                handles.append(handle)
+
+    producers = [threading.Thread(target=producer, args=(t,)) for t in range(THREADS)]
+    for p in producers:
+        p.start()
+    for p in producers:
+        p.join()
+
+    for handle in handles:
+        assert handle.future.result(timeout=60) == "completed"
+    assert wait_until(lambda: dl._state == "idle")
+
+    assert len(handles) == THREADS * ITEMS_PER_THREAD
+    assert set(runs.values()) == {1}  # every item ran, and ran once
+    assert len(runs) == THREADS * ITEMS_PER_THREAD
+    assert peak["total"] <= gl.download_max_concurrent
+    assert peak["host"] <= gl.download_per_host_limit
+    assert not len(gl.download_queue)
+    assert dl._active_total == 0
+    assert not any(dl._active_by_host.values())
+    assert not gl.isDownloading
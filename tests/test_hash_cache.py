@@ -0,0 +1,24 @@
+# tests/test_hash_cache.py
+import os
+
+import scripts.arcenciel_paths as path_utils
+import scripts.arcenciel_hash_cache as hash_cache
+
+
+def test_checkpoint_titles_use_the_path_inside_the_model_dir(tmp_path, monkeypatch):
+    models = tmp_path / "Stable-diffusion"
+    monkeypatch.setattr(path_utils, "load_paths", lambda: {"CHECKPOINT": str(models)})
+
+    inside = str(models / "sdxl" / "model.safetensors")
+    assert hash_cache._webui_titles(inside, "CHECKPOINT") == [
+        "checkpoint/" + os.path.join("sdxl", "model.safetensors")]
+
+    # Same file name elsewhere, including a sibling whose name merely starts
+    # with the model dir's: no title, so no chance of another file's sha256
+    for outside in (tmp_path / "elsewhere" / "model.safetensors",
+                    tmp_path / "Stable-diffusion-old" / "model.safetensors"):
+        assert hash_cache._webui_titles(str(outside), "CHECKPOINT") == []
+
+
+def test_lora_titles_are_unchanged():
+    assert hash_cache._webui_titles("/loras/style.safetensors", "LORA") == ["lora/style"]
@@ -0,0 +1,64 @@
+# tests/test_library.py
+import os
+
+import pytest
+
+import scripts.arcenciel_paths as path_utils
+import scripts.arcenciel_hash_cache as hash_cache
+import scripts.arcenciel_library as library
+
+SHA = "ab" * 32
+
+
+@pytest.fixture
+def lib(tmp_path, monkeypatch):
+    """An empty library and hash cache, both stored under tmp_path."""
+    monkeypatch.setattr(library, "LIBRARY_DB", tmp_path / "library_index.db")
+    for name, value in (("_loaded", False), ("_files", {}), ("_dirs", {}), ("_by_sha", {}),
+                        ("_by_model", {}), ("_by_version", {}),
+                        ("_dirty_files", set()), ("_dirty_dirs", set())):
+        monkeypatch.setattr(library, name, value)
+    monkeypatch.setattr(hash_cache, "HASH_CACHE_FILE", tmp_path / "hash_cache.json")
+    monkeypatch.setattr(hash_cache, "_entries", None)
+    monkeypatch.setattr(hash_cache, "webui_cache", None)
+    return tmp_path
+
+
+def write(path, data=b"model"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_nested_folders_keep_the_most_specific_type(lib, monkeypatch):
+    models, loras = lib / "models", lib / "models" / "Lora"
+    monkeypatch.setattr(path_utils, "load_paths", lambda: {"CHECKPOINT": str(models), "LORA": str(loras)})
+    checkpoint = write(models / "base.safetensors")
+    lora = write(loras / "style.safetensors")
+
+    # The outer folder first, then the inner one, then the outer one again
+    library.scan(str(models), "CHECKPOINT")
+    library.scan(str(loras), "LORA")
+    os.utime(models, ns=(0, 0))  # make the outer folder look changed
+    library.scan(str(models), "CHECKPOINT")
+
+    assert library.get(checkpoint)["model_type"] == "CHECKPOINT"
+    assert library.get(lora)["model_type"] == "LORA"
+
+
+def test_dedupe_goes_through_the_library(lib, monkeypatch):
+    source = write(lib / "a" / "model.safetensors")
+    library.record_hash(source, SHA, "LORA")
+    assert library.find_by_sha256([None, SHA.upper()]) == [os.path.abspath(source)]
+
+    target = write(lib / "b" / "model.safetensors")
+    library.record_copy(source, target, 1, 2, "LORA")
+    entry = library.get(target)
+    assert (entry["sha256"], entry["model_id"], entry["version_id"]) == (SHA, "1", "2")
+    assert hash_cache.lookup(target) == SHA
+    assert library.find_by_sha256([SHA]) == sorted([os.path.abspath(source), os.path.abspath(target)])
+
+    # Rewritten since it was hashed: no longer a duplicate
+    write(source, b"something else")
+    assert library.find_by_sha256([SHA]) == [os.path.abspath(target)]
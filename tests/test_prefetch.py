@@ -0,0 +1,42 @@
+# tests/test_prefetch.py
+import pytest
+
+pytest.importorskip("requests")
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_http as http
+import scripts.arcenciel_prefetch as prefetch
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+    text = '{"data": []}'
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"data": []}
+
+
+class FakeSession:
+    def __init__(self):
+        self.interactive_during = []
+
+    def get(self, url, **kwargs):
+        self.interactive_during.append(http._interactive_in_flight)
+        return FakeResponse()
+
+
+def test_prefetch_search_stays_out_of_interactive_lane(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(http, "get_session", lambda: session)
+    monkeypatch.setattr(gl, "response_cache_ttls", {})  # always go to the "network"
+    monkeypatch.setattr(http, "_request_counts", {})
+
+    prefetch.cancel()
+    prefetch._prefetch_page(prefetch._generation, {"search_term": "lane", "page": 2})
+
+    assert session.interactive_during == [0]
+    assert http._request_counts == {"prefetch": 1}
@@ -0,0 +1,157 @@
+# tests/test_segmented_download.py
+import os
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("tqdm")
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_library as library
+import scripts.arcenciel_hash_cache as hash_cache
+import scripts.arcenciel_download as dl
+import scripts.arcenciel_download_status as download_status
+
+SEGMENT = 128 * 1024
+CHUNK = 16 * 1024
+BODY = os.urandom(4 * SEGMENT + 1000)  # five segments, the last one short
+
+
+class RangeServer:
+    """
+    Local stand-in for a CDN that honors Range (unless 'ranges' is False).
+    Each start offset in 'drop_at' is answered once with half its range,
+    then the connection is closed.
+    """
+
+    def __init__(self, ranges=True, drop_at=()):
+        self.ranges = ranges
+        self.drop_at = set(drop_at)
+        self.requests = []  # Range header of every GET, None without one
+        self.lock = threading.Lock()
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                owner.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/model.safetensors"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle(self, h):
+        range_header = h.headers.get("Range")
+        with self.lock:
+            self.requests.append(range_header)
+        if not self.ranges or not range_header:
+            self.send(h, 200, BODY, {})
+            return
+        first, _, last = range_header[len("bytes="):].partition("-")
+        start, end = int(first), int(last) if last else len(BODY) - 1
+        headers = {"Content-Range": f"bytes {start}-{end}/{len(BODY)}"}
+        body = BODY[start:end + 1]
+        with self.lock:
+            drop = start in self.drop_at
+            self.drop_at.discard(start)
+        if drop:
+            self.send(h, 206, body, headers, cut=len(body) // 2)
+        else:
+            self.send(h, 206, body, headers)
+
+    def send(self, h, status, body, headers, cut=None):
+        h.send_response(status)
+        h.send_header("Accept-Ranges", "bytes" if self.ranges else "none")
+        h.send_header("ETag", '"v1"')
+        h.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            h.send_header(name, value)
+        h.end_headers()
+        h.wfile.write(body if cut is None else body[:cut])
+        if cut is not None:
+            h.wfile.flush()
+            h.close_connection = True
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def segmented(monkeypatch):
+    monkeypatch.setattr(gl, "journal_enabled", False)
+    monkeypatch.setattr(gl, "download_connections", 3)
+    monkeypatch.setattr(gl, "download_segment_size", SEGMENT)
+    monkeypatch.setattr(gl, "download_segmented_min_size", 0)
+    monkeypatch.setattr(gl, "download_chunk_min", CHUNK)
+    monkeypatch.setattr(gl, "download_chunk_max", CHUNK)
+    monkeypatch.setattr(gl, "download_retry_max_delay", 0)
+    monkeypatch.setattr(gl, "download_free_space_margin", 0)
+    # Keep the verified file out of the extension's own indexes
+    monkeypatch.setattr(hash_cache, "store", lambda *args, **kwargs: None)
+    monkeypatch.setattr(hash_cache, "save", lambda *args, **kwargs: None)
+    monkeypatch.setattr(library, "record_download", lambda *args, **kwargs: None)
+    servers = []
+
+    def start(**kwargs):
+        servers.append(RangeServer(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def new_item(server, tmp_path):
+    return dl._new_item(1, 2, server.url, str(tmp_path / "model.safetensors"), "LORA", 0,
+                        [hashlib.sha256(BODY).hexdigest()])
+
+
+def test_segmented_download_fetches_every_range(segmented, tmp_path):
+    server = segmented()
+    item = new_item(server, tmp_path)
+
+    assert dl.do_download(item) == "completed"
+    assert (tmp_path / "model.safetensors").read_bytes() == BODY
+    assert not os.path.exists(item["filename"] + ".part.json")
+
+    ranges = sorted(r for r in server.requests if r != "bytes=0-0")  # minus the probe
+    expected = [f"bytes={s}-{min(s + SEGMENT, len(BODY)) - 1}" for s in range(0, len(BODY), SEGMENT)]
+    assert ranges == sorted(expected)
+
+    segments = download_status._segments_status(item)
+    assert len(segments) == 5
+    assert all(done == size for done, size in segments)
+    assert sum(size for _, size in segments) == len(BODY)
+
+
+def test_segment_resumes_after_a_dropped_connection(segmented, tmp_path):
+    server = segmented(drop_at=[SEGMENT])
+    item = new_item(server, tmp_path)
+
+    assert dl.do_download(item) == "completed"
+    assert (tmp_path / "model.safetensors").read_bytes() == BODY
+
+    # Segment 1 was cut off halfway; the retry asks only for the rest of it
+    resumed_from = SEGMENT + SEGMENT // 2
+    assert f"bytes={resumed_from}-{2 * SEGMENT - 1}" in server.requests
+    # and finished segments were not fetched again
+    seg0 = f"bytes=0-{SEGMENT - 1}"
+    assert server.requests.count(seg0) == 1
+
+
+def test_falls_back_to_a_single_stream_without_ranges(segmented, tmp_path):
+    server = segmented(ranges=False)
+    item = new_item(server, tmp_path)
+
+    assert dl.do_download(item) == "completed"
+    assert (tmp_path / "model.safetensors").read_bytes() == BODY
+    assert "segments" not in item
+    assert download_status._segments_status(item) is None
@@ -0,0 +1,48 @@
+# tests/test_server_routes.py
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")  # fastapi.testclient
+pytest.importorskip("gradio")
+pytest.importorskip("modules.shared")  # only inside a WebUI checkout
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_download as dl
+import scripts.arcenciel_server as server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(gl, "journal_enabled", False)
+    monkeypatch.setattr(server, "route_registered", False)
+    app = FastAPI()
+    server.ensure_server_routes(app)
+    yield TestClient(app)
+    dl.cancel_all_downloads()
+
+
+@pytest.fixture
+def queued_item(tmp_path):
+    # Queued but not started: no dispatcher, no network
+    handle = dl.queue_download(11, 22, "http://example.invalid/file", str(tmp_path / "m.safetensors"))
+    return handle.item
+
+
+def test_limit_route_sets_rate(client, queued_item):
+    r = client.post("/arcenciel/downloads/11/22/limit", json={"rate": 1000})
+    assert r.status_code == 200
+    assert r.json()["ok"] is True
+    assert queued_item["rate_limit"] == 1000
+
+    r = client.post("/arcenciel/downloads/11/22/limit", json={"rate": None})
+    assert r.json()["ok"] is True
+    assert queued_item["rate_limit"] is None
+
+
+def test_action_route_still_handles_controls(client, queued_item):
+    r = client.post("/arcenciel/downloads/11/22/pause")
+    assert r.json() == {"key": queued_item["key"], "ok": True, "status": "paused"}
+    assert client.post("/arcenciel/downloads/11/22/bogus").status_code == 404
@@ -0,0 +1,81 @@
+# tests/test_thumbs.py
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+
+import scripts.arcenciel_http as http
+import scripts.arcenciel_thumbs as thumbs
+
+WEBP = b"RIFF\x00\x00\x00\x00WEBPVP8 "
+
+
+class FakeResponse:
+    content = WEBP
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbs, "THUMB_CACHE_DIR", tmp_path / "thumbnails")
+    monkeypatch.setattr(thumbs, "_index", None)
+    monkeypatch.setattr(thumbs, "_total_bytes", 0)
+    monkeypatch.setattr(thumbs, "_fetch_locks", {})
+    return tmp_path
+
+
+def test_one_fetch_at_a_time_per_thumbnail(store, monkeypatch):
+    lock = threading.Lock()
+    calls = []
+    running = [0, 0]  # now, peak
+
+    def get(url, kind=None, **kwargs):
+        with lock:
+            calls.append(url)
+            first = len(calls) == 1
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.3)
+        with lock:
+            running[0] -= 1
+        if first:
+            raise OSError("connection reset")
+        return FakeResponse()
+
+    monkeypatch.setattr(http, "get", get)
+
+    # A's fetch fails while B waits for it; B then fetches, and C arrives
+    # during B's fetch. C must wait for B, not start a fetch of its own.
+    results = {}
+
+    def fetch(name):
+        results[name] = thumbs.get_thumbnail("models/a.png")
+
+    threads = []
+    for name, delay in (("a", 0), ("b", 0.1), ("c", 0.35)):
+        time.sleep(delay)
+        t = threading.Thread(target=fetch, args=(name,))
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+
+    assert running[1] == 1
+    assert len(calls) == 2
+    assert results["a"] is None
+    assert results["b"] == results["c"] == thumbs.THUMB_CACHE_DIR / thumbs._name_for("models/a.png")
+    assert thumbs._fetch_locks == {}
+
+
+def test_unwritable_store_still_returns_the_bytes(store, monkeypatch):
+    blocker = store / "not_a_dir"
+    blocker.write_bytes(b"")
+    monkeypatch.setattr(thumbs, "THUMB_CACHE_DIR", blocker / "thumbnails")
+    monkeypatch.setattr(http, "get", lambda url, kind=None, **kwargs: FakeResponse())
+
+    assert thumbs.load_thumbnail("models/b.png") == (None, WEBP)
+    assert thumbs.get_thumbnail("models/b.png") is None
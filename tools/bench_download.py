@@ -0,0 +1,117 @@
+# tools/bench_download.py
+"""
+Download write-path benchmark: MB/s and client CPU% of the old
+iter_content(4096) loop vs. the current single-stream transfer
+(arcenciel_download._transfer_single), against a local HTTP server.
+
+    python tools/bench_download.py [--size-mb 1024] [--runs 2]
+
+Run from the extension root, outside WebUI (needs requests and tqdm; Unix,
+for the resource module).
+The server runs in a separate process (python -m http.server), so the CPU
+figures are the client's alone: user+system time of this process divided
+by wall time. The current path also computes the sha256 inline, so its
+CPU% includes hashing the old loop never did.
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import contextlib
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tqdm
+
+import scripts.arcenciel_global as gl
+import scripts.arcenciel_http as http
+import scripts.arcenciel_download as dl
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def old_loop(url, out, devnull):
+    """The pre-change do_download loop: 4 KiB chunks, one tqdm update each."""
+    with http.get(url, kind="download", stream=True) as r, open(out, "wb") as f, \
+            tqdm.tqdm(total=int(r.headers["content-length"]), unit="B", unit_scale=True,
+                      ascii=True, file=devnull) as pbar:
+        for chunk in r.iter_content(chunk_size=4096):
+            f.write(chunk)
+            pbar.update(len(chunk))
+
+
+def current_path(url, out, devnull):
+    part_path, meta_path = dl._part_paths(out)
+    for path in (out, part_path, meta_path):
+        if os.path.exists(path):
+            os.remove(path)
+    item = dl._new_item(0, 0, url, out, None, 0, ())
+    assert dl._transfer_single(url, out, part_path, meta_path, item) == "completed"
+    os.replace(part_path, out)
+    os.remove(meta_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=1024, help="size of the generated file")
+    parser.add_argument("--runs", type=int, default=2, help="runs of each variant, alternating")
+    args = parser.parse_args()
+
+    gl.journal_enabled = False
+    work_dir = tempfile.mkdtemp(prefix="arcen_bench_")
+    server = None
+    try:
+        src = os.path.join(work_dir, "serve", "model.bin")
+        os.makedirs(os.path.dirname(src))
+        with open(src, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1",
+             "--directory", os.path.dirname(src)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{port}/model.bin"
+        for _ in range(50):
+            try:
+                http.head(url, kind="local")
+                break
+            except Exception:
+                time.sleep(0.1)
+
+        out = os.path.join(work_dir, "model.bin")
+        with open(os.devnull, "w") as devnull:
+            for _ in range(args.runs):
+                for name, fn in (("iter_content(4096)", old_loop), ("current", current_path)):
+                    cpu0, t0 = cpu_seconds(), time.perf_counter()
+                    with contextlib.redirect_stderr(devnull):  # the transfer's own progress bar
+                        fn(url, out, devnull)
+                    wall, cpu = time.perf_counter() - t0, cpu_seconds() - cpu0
+                    assert os.path.getsize(out) == args.size_mb * 1024 * 1024
+                    print(f"{name:>20}: {args.size_mb / wall:7.1f} MB/s  client CPU {100 * cpu / wall:5.1f}%  "
+                          f"({wall:.2f}s wall, {cpu:.2f}s cpu)")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()